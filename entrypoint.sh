@@ -1,4 +1,10 @@
 #!/bin/bash
+# Воркер парсинга — отдельный процесс (группа процессов "worker" в fly.toml):
+# он держит браузер открытым и берет задания из очереди, не отнимая память у веб-сервера
+if [ "$1" = "worker" ]; then
+    exec python manage.py parser_worker
+fi
+
 # Запускаем миграции
 python manage.py migrate --noinput
 # Создаем суперпользователя (для первого запуска)
@@ -11,7 +11,8 @@ from django.conf import settings # <-- Убедитесь, что этот им
 from .models import Establishment
 from locations.models import Country, City
 from categories.models import Category, Subcategory
-from promotions.models import Promotion, Media
+from promotions.models import Promotion, Media, ClassificationCache, ParseMark, ParseJob, ParseLease, RateLimitState, ParseRun, ParseCheckpoint, HighlightTitleVerdict, HighlightSlide, MediaBlob
+from promotions.admin import HighlightTitleVerdictAdmin
 
 class CustomAdminSite(admin.AdminSite):
     """Наша кастомная админка с дополнительными страницами."""
@@ -91,4 +92,14 @@ site.register(City)
 site.register(Category)
 site.register(Subcategory)
 site.register(Promotion)
-site.register(Media)
\ No newline at end of file
+site.register(Media)
+site.register(MediaBlob)
+site.register(ClassificationCache)
+site.register(ParseMark)
+site.register(ParseJob)
+site.register(ParseLease)
+site.register(RateLimitState)
+site.register(ParseRun)
+site.register(ParseCheckpoint)
+site.register(HighlightTitleVerdict, HighlightTitleVerdictAdmin)
+site.register(HighlightSlide)
\ No newline at end of file
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='last_parsed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Последний парсинг'),
+        ),
+    ]
@@ -9,6 +9,9 @@ class Establishment(models.Model):
     
     city = models.ForeignKey(City, on_delete=models.PROTECT, related_name="establishments", verbose_name="Город")
     subcategory = models.ForeignKey(Subcategory, on_delete=models.PROTECT, related_name="establishments", verbose_name="Подкатегория")
+
+    # Когда парсер последний раз успешно обработал профиль (для выборочных запусков)
+    last_parsed_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Последний парсинг")
     
     def __str__(self):
         return self.name
@@ -119,7 +119,30 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+# Медиафайлы: общее облачное хранилище (R2/S3), если задан бакет, иначе локальный диск.
+# Воркер парсинга работает на отдельной машине (fly.toml, render.yaml): файлы, скачанные
+# на его диск, веб-сервер отдать не сможет, поэтому в проде бакет обязателен.
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+if AWS_STORAGE_BUCKET_NAME:
+    AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
+    AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    # Для R2: https://<account_id>.r2.cloudflarestorage.com
+    AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
+    AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', 'auto')
+    # Публичный домен бакета; без него ссылки на файлы подписываются
+    AWS_S3_CUSTOM_DOMAIN = os.environ.get('AWS_S3_CUSTOM_DOMAIN')
+    AWS_QUERYSTRING_AUTH = not AWS_S3_CUSTOM_DOMAIN
+    AWS_DEFAULT_ACL = None
+    # Как у FileSystemStorage: файл с занятым именем не перезаписывается
+    AWS_S3_FILE_OVERWRITE = False
+    MEDIA_STORAGE_BACKEND = 'storages.backends.s3.S3Storage'
+else:
+    MEDIA_STORAGE_BACKEND = 'django.core.files.storage.FileSystemStorage'
+# DEFAULT_FILE_STORAGE и STATICFILES_STORAGE Django 5.1+ не читает — хранилища задаются здесь
+STORAGES = {
+    'default': {'BACKEND': MEDIA_STORAGE_BACKEND},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 # --- Твой CORS (все правильно) ---
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
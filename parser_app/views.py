@@ -161,7 +161,8 @@ def download_media(page, content_type, date_range, folder):
                 if download_url.startswith('/get'):
                     download_url = f"https://media.storiesig.info{download_url}"
                 
-                response = requests.get(download_url)
+                # stream=True: файл пишется на диск кусками, а не целиком через память
+                response = requests.get(download_url, stream=True)
                 response.raise_for_status()
 
                 default_ext = ".mp4" if is_video else ".jpg"
@@ -175,7 +176,8 @@ def download_media(page, content_type, date_range, folder):
                 
                 file_path = os.path.join(folder, file_name)
                 with open(file_path, 'wb') as f:
-                    f.write(response.content)
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
             except requests.exceptions.RequestException as e:
                 print(f"      Не смог скачать файл: {e}")
     
@@ -1,5 +1,31 @@
 from django.contrib import admin
-from .models import Promotion, Media
+from .models import (
+    Promotion, Media, ClassificationCache, ParseMark, ParseJob, ParseLease, RateLimitState, ParseRun, ParseCheckpoint,
+    HighlightTitleVerdict, HighlightSlide, MediaBlob,
+)
+
+
+class HighlightTitleVerdictAdmin(admin.ModelAdmin):
+    """Решения по названиям 'Актуального': правка администратора закрепляет решение навсегда."""
+    list_display = ('title', 'example', 'is_promotion', 'source', 'hits', 'updated_at')
+    list_editable = ('is_promotion',)
+    list_filter = ('is_promotion', 'source')
+    search_fields = ('title', 'example')
+
+    def save_model(self, request, obj, form, change):
+        obj.source = HighlightTitleVerdict.SOURCE_MANUAL
+        super().save_model(request, obj, form, change)
+
 
 admin.site.register(Promotion)
-admin.site.register(Media)
\ No newline at end of file
+admin.site.register(Media)
+admin.site.register(MediaBlob)
+admin.site.register(ClassificationCache)
+admin.site.register(ParseMark)
+admin.site.register(ParseJob)
+admin.site.register(ParseLease)
+admin.site.register(RateLimitState)
+admin.site.register(ParseRun)
+admin.site.register(ParseCheckpoint)
+admin.site.register(HighlightTitleVerdict, HighlightTitleVerdictAdmin)
+admin.site.register(HighlightSlide)
\ No newline at end of file
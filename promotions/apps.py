@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PromotionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'promotions'
+
+    def ready(self):
+        # Подключает обработчик удаления Media (счетчик ссылок на файлы хранилища)
+        from . import blobs  # noqa: F401
@@ -0,0 +1,105 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Файл кладется в хранилище по пути из своего sha256 (blobs/ab/cd/<sha256>.jpg), поэтому
+одинаковое содержимое загружается в R2/S3 только один раз, сколько бы акций на него
+ни ссылалось. MediaBlob.ref_count считает ссылки из Media: при удалении Media счетчик
+уменьшается, и файл без ссылок удаляется из хранилища.
+"""
+import hashlib
+import os
+
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from promotions import mediainfo
+from promotions.models import Media, MediaBlob
+
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_path(sha256, extension):
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def extension_of(name, default=""):
+    return os.path.splitext(name or "")[1] or default
+
+
+def hash_file(fileobj):
+    """sha256 и размер файла, читая его кусками. Файл перематывается в начало."""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def find_blob(sha256):
+    return MediaBlob.objects.filter(sha256=sha256).first()
+
+
+def upload_blob(fileobj, sha256, extension):
+    """Кладет файл в хранилище по адресу содержимого (если его там еще нет). Возвращает путь."""
+    path = blob_path(sha256, extension)
+    if default_storage.exists(path):
+        return path
+    return default_storage.save(path, File(fileobj, name=path))
+
+
+def register_blob(sha256, path, size, metadata=None):
+    """
+    Запись MediaBlob для загруженного файла (или уже существующая, если ее успели создать параллельно).
+    metadata — результат mediainfo.probe().
+    """
+    try:
+        with transaction.atomic():
+            return MediaBlob.objects.create(sha256=sha256, file_path=path, size=size, **(metadata or {}))
+    except IntegrityError:
+        return MediaBlob.objects.get(sha256=sha256)
+
+
+def store_blob(fileobj, sha256, size, extension):
+    """find_blob + upload_blob + register_blob одним вызовом (для синхронного кода)."""
+    blob = find_blob(sha256)
+    if blob is None:
+        metadata = mediainfo.probe(fileobj)
+        blob = register_blob(sha256, upload_blob(fileobj, sha256, extension), size, metadata)
+    return blob
+
+
+def create_media(promotion, blob, file_type, source_key=""):
+    """Создает Media, ссылающуюся на blob, и увеличивает счетчик ссылок."""
+    with transaction.atomic():
+        media = Media.objects.create(
+            promotion=promotion, blob=blob, file_path=blob.file_path, file_type=file_type, source_key=source_key
+        )
+        MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return media
+
+
+def release_blob(blob_id):
+    """Уменьшает счетчик ссылок; файл без ссылок удаляется из хранилища."""
+    MediaBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    orphan = MediaBlob.objects.filter(pk=blob_id, ref_count=0).first()
+    if orphan is None or Media.objects.filter(blob_id=blob_id).exists():
+        return
+    paths = [orphan.file_path, orphan.thumbnail_path, orphan.medium_path]
+    orphan.delete()
+    for path in paths:
+        if path:
+            default_storage.delete(path)
+
+
+@receiver(post_delete, sender=Media)
+def release_media_blob(sender, instance, **kwargs):
+    # Срабатывает и при каскадном удалении Media вместе с акцией
+    if instance.blob_id:
+        transaction.on_commit(lambda: release_blob(instance.blob_id))
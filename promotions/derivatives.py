@@ -0,0 +1,95 @@
+"""
+Уменьшенные копии картинок (миниатюра для карточек и средний размер для просмотра).
+
+Делаются при загрузке файла (парсером и при ручном создании акции) и командой
+build_media_derivatives для старых файлов. Сжатие — работа для процессора, поэтому
+в парсере и в команде оно идет в пуле процессов и не тормозит скачивание.
+Копии привязаны к MediaBlob, то есть делаются один раз на уникальное содержимое.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from promotions import imaging
+from promotions.models import MediaBlob
+
+# Максимальная сторона (px) для каждой копии; имя копии = поле MediaBlob.<имя>_path
+SIZES = {
+    'thumbnail': getattr(settings, 'MEDIA_THUMBNAIL_SIZE', 320),
+    'medium': getattr(settings, 'MEDIA_MEDIUM_SIZE', 1080),
+}
+IMAGE_FORMAT = getattr(settings, 'MEDIA_DERIVATIVE_FORMAT', 'WEBP')  # или 'JPEG'
+QUALITY = getattr(settings, 'MEDIA_DERIVATIVE_QUALITY', 80)
+WORKERS = getattr(settings, 'MEDIA_DERIVATIVE_WORKERS', 2)
+
+EXTENSIONS = {'WEBP': '.webp', 'JPEG': '.jpg'}
+
+_pool = None
+
+
+def get_pool():
+    """Пул процессов для сжатия. spawn — чтобы дочерние процессы не наследовали потоки и соединения с БД."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def render_job():
+    """Функция для пула: сжимает байты картинки во все размеры."""
+    return partial(imaging.render_derivatives, sizes=SIZES, image_format=IMAGE_FORMAT, quality=QUALITY)
+
+
+def derivative_path(sha256, name):
+    return f"derivatives/{sha256[:2]}/{sha256[2:4]}/{sha256}_{name}{EXTENSIONS[IMAGE_FORMAT]}"
+
+
+def upload_derivatives(blob, rendered):
+    """Кладет готовые копии в хранилище. Возвращает {поле MediaBlob: путь}."""
+    paths = {}
+    for name, data in rendered.items():
+        path = derivative_path(blob.sha256, name)
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(data))
+        paths[f"{name}_path"] = path
+    return paths
+
+
+def save_paths(blob, paths):
+    MediaBlob.objects.filter(pk=blob.pk).update(**paths)
+    for field, path in paths.items():
+        setattr(blob, field, path)
+
+
+def build_sync(blob, data):
+    """Делает копии в текущем процессе (для единичных файлов, например загрузки админом)."""
+    if not imaging.available():
+        return False
+    save_paths(blob, upload_derivatives(blob, render_job()(data)))
+    return True
+
+
+_upload_derivatives = sync_to_async(upload_derivatives, thread_sensitive=False)
+_save_paths = sync_to_async(save_paths, thread_sensitive=True)
+
+
+async def build(blob, data):
+    """Делает копии в пуле процессов, не блокируя цикл событий парсера."""
+    if not imaging.available():
+        return False
+    rendered = await asyncio.get_running_loop().run_in_executor(get_pool(), render_job(), data)
+    await _save_paths(blob, await _upload_derivatives(blob, rendered))
+    return True
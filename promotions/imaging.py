@@ -0,0 +1,35 @@
+"""
+Уменьшенные копии картинок. Модуль не зависит от Django: его функции
+выполняются в отдельных процессах (см. promotions.derivatives).
+"""
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — уменьшенные копии не делаются
+    Image = ImageOps = None
+
+
+def available():
+    return Image is not None
+
+
+def render_derivatives(data, sizes, image_format='WEBP', quality=80):
+    """
+    data — байты исходной картинки, sizes — {имя: максимальная сторона в пикселях}.
+    Возвращает {имя: байты}. Картинки меньше нужного размера не увеличиваются.
+    """
+    results = {}
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for name, max_side in sizes.items():
+            copy = image.copy()
+            copy.thumbnail((max_side, max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            copy.save(buffer, format=image_format, quality=quality)
+            results[name] = buffer.getvalue()
+    return results
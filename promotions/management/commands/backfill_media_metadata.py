@@ -0,0 +1,59 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from promotions import mediainfo
+from promotions.models import Media, MediaBlob
+
+
+class Command(BaseCommand):
+    help = 'Заполняет MIME-тип, размеры и длительность у файлов хранилища, загруженных до появления метаданных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Перечитать метаданные и у файлов, где они уже заполнены')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько записей MediaBlob читать из БД за раз')
+
+    def handle(self, *args, **kwargs):
+        legacy = Media.objects.filter(blob__isnull=True).count()
+        if legacy:
+            self.stdout.write(self.style.WARNING(
+                f"Медиафайлов без записи в хранилище: {legacy} — сначала запустите dedupe_media."
+            ))
+
+        queryset = MediaBlob.objects.order_by('id')
+        if not kwargs['force']:
+            queryset = queryset.filter(mime_type='')
+        total = queryset.count()
+        self.stdout.write(f"Файлов к обработке: {total}.")
+
+        updated = missing = 0
+        for number, blob in enumerate(queryset.iterator(chunk_size=kwargs['batch_size']), start=1):
+            try:
+                # Читаются только заголовки файла, а не все содержимое
+                with default_storage.open(blob.file_path, 'rb') as f:
+                    fields = mediainfo.probe(f)
+                    if not blob.size:
+                        f.seek(0, 2)
+                        fields['size'] = f.tell()
+            except (FileNotFoundError, OSError) as e:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"  ! {blob.file_path}: файл не прочитан: {e}"))
+                continue
+            MediaBlob.objects.filter(pk=blob.pk).update(**fields)
+            updated += 1
+            if number % 100 == 0:
+                self.stdout.write(f"  ...обработано {number} из {total}")
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено: {updated}, не найдено файлов: {missing}."))
+        self.report()
+
+    def report(self):
+        """Сколько места занимают файлы каждого типа."""
+        rows = MediaBlob.objects.values('mime_type').annotate(files=Count('id'), total=Sum('size')).order_by('-total')
+        self.stdout.write("\nХранилище по типам файлов:")
+        for row in rows:
+            self.stdout.write(
+                f"  {row['mime_type'] or 'неизвестно'}: {row['files']} файлов, {(row['total'] or 0) / 1024 / 1024:.1f} МБ"
+            )
@@ -0,0 +1,68 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from promotions import derivatives, imaging
+from promotions.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = 'Делает уменьшенные копии (миниатюра и средний размер) для картинок, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать копии и у тех картинок, где они уже есть')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Обработать не больше N файлов')
+
+    def handle(self, *args, **kwargs):
+        if not imaging.available():
+            raise CommandError("Не установлен Pillow — уменьшенные копии сделать нельзя.")
+
+        queryset = MediaBlob.objects.filter(media__file_type='image').distinct().order_by('id')
+        if not kwargs['force']:
+            queryset = queryset.filter(thumbnail_path='')
+        if kwargs['limit']:
+            queryset = queryset[:kwargs['limit']]
+        blobs = list(queryset)
+        self.stdout.write(f"Картинок к обработке: {len(blobs)}.")
+
+        done = failed = 0
+        pool = derivatives.get_pool()
+        # В очереди пула держим не больше пары файлов на процесс, чтобы не читать в память все сразу
+        max_pending = derivatives.WORKERS * 2
+        pending = {}
+        try:
+            for blob in blobs:
+                try:
+                    with default_storage.open(blob.file_path, 'rb') as f:
+                        data = f.read()
+                except (FileNotFoundError, OSError) as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"  ! {blob.file_path}: файл не прочитан: {e}"))
+                    continue
+                pending[pool.submit(derivatives.render_job(), data)] = blob
+                if len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    d, f = self.collect(finished, pending)
+                    done, failed = done + d, failed + f
+            d, f = self.collect(wait(pending)[0], pending)
+            done, failed = done + d, failed + f
+        finally:
+            derivatives.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: {done}, с ошибками: {failed}."))
+
+    def collect(self, finished, pending):
+        """Загружает готовые копии в хранилище и записывает пути в MediaBlob."""
+        done = failed = 0
+        for future in finished:
+            blob = pending.pop(future)
+            try:
+                derivatives.save_paths(blob, derivatives.upload_derivatives(blob, future.result()))
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  ! {blob.file_path}: {e}"))
+        return done, failed
@@ -0,0 +1,71 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from promotions import blobs
+from promotions.models import Media, MediaBlob
+
+
+class Command(BaseCommand):
+    help = 'Переводит старые медиафайлы на хранение по хэшу содержимого и удаляет дубликаты из хранилища'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать дубликаты, ничего не менять')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько записей Media читать из БД за раз')
+
+    def handle(self, *args, **kwargs):
+        dry_run = kwargs['dry_run']
+        queryset = Media.objects.filter(blob__isnull=True).order_by('id')
+        total = queryset.count()
+        self.stdout.write(f"Медиафайлов без хэша: {total}.")
+
+        kept = duplicates = missing = 0
+        saved_bytes = 0
+        seen = {}  # sha256 -> путь первого файла с таким содержимым (для --dry-run)
+        for number, media in enumerate(queryset.iterator(chunk_size=kwargs['batch_size']), start=1):
+            try:
+                # Файл читается потоком, целиком в память не загружается
+                with default_storage.open(media.file_path, 'rb') as f:
+                    sha256, size = blobs.hash_file(f)
+            except (FileNotFoundError, OSError) as e:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"  ! Media #{media.id}: файл {media.file_path} не прочитан: {e}"))
+                continue
+
+            blob = blobs.find_blob(sha256)
+            original_path = blob.file_path if blob else seen.get(sha256)
+            if original_path is None:
+                # Первый файл с таким содержимым остается на месте и становится общим
+                kept += 1
+                seen[sha256] = media.file_path
+                if not dry_run:
+                    blob = blobs.register_blob(sha256, media.file_path, size)
+            else:
+                duplicates += 1
+                saved_bytes += size
+
+            if not dry_run:
+                self.attach(media, blob)
+
+            if number % 100 == 0:
+                self.stdout.write(f"  ...обработано {number} из {total}")
+
+        action = "можно удалить" if dry_run else "удалено"
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: уникальных файлов {kept}, дубликатов {duplicates} ({action} {saved_bytes / 1024 / 1024:.1f} МБ), "
+            f"не найдено {missing}."
+        ))
+
+    def attach(self, media, blob):
+        """Переводит Media на общий файл; старый файл-дубликат удаляется, если на него больше никто не ссылается."""
+        old_path = media.file_path
+        with transaction.atomic():
+            media.blob = blob
+            media.file_path = blob.file_path
+            media.save(update_fields=['blob', 'file_path'])
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        if old_path != blob.file_path and not Media.objects.filter(file_path=old_path).exists():
+            default_storage.delete(old_path)
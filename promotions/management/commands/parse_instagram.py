@@ -1,43 +1,58 @@
-import os
+import hashlib
+import httpx
 import requests
 import asyncio
 from bs4 import BeautifulSoup
 from datetime import datetime, time, timedelta
+from time import monotonic
 
-from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
 from django.core.files.storage import default_storage 
 from django.core.files.base import ContentFile      
-from playwright.async_api import async_playwright, TimeoutError
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError
 from asgiref.sync import sync_to_async
-from openai import AsyncOpenAI, APIError 
 
 
-from establishments.models import Establishment
-from promotions.models import Promotion, Media
-
-OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
-AI_MODEL_NAME = "mistralai/mistral-nemo"
-ai_client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPENROUTER_API_KEY)
-
-def parse_date(date_string):
-    if not date_string: return None
-    date_part = date_string.split(',')[0].strip()
-    formats = ['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y']
-    for fmt in formats:
-        try: return datetime.strptime(date_part, fmt)
-        except ValueError: continue
-    return None
-
-@sync_to_async
+from promotions import derivatives
+from promotions.parsing import cache, checkpoints, classifier, downloads, highlight_titles, leases, pipeline, ratelimit, session, slides, waits
+from promotions.parsing.browser import ResourceBlocker, memory_used_mb
+from promotions.parsing.classifier import AI_MODEL_NAME, classify_posts, classify_highlight_title
+from promotions.parsing.extract import HIGHLIGHT_SELECTOR, ITEM_SELECTOR, extract_highlight_titles, extract_media_items
+from promotions.parsing.fingerprint import has_media, item_identity, media_key, upsert_promotion
+from promotions.parsing.marks import get_marks, mark_parsed, save_mark
+from promotions.parsing.output import current_profile, log, tag
+from promotions.parsing.jobs import make_dedupe_key
+from promotions.parsing.selection import describe, in_shard, parse_shard, select_establishments, selection_params
+
+STORIESIG_URL = "https://storiesig.info/en/"
+STORIESIG_HOST = "storiesig.info"
+INSTAGRAM_HOST = "www.instagram.com"
+SECTIONS = ('posts', 'stories', 'highlights')
+# Сколько ждать результатов поиска: после первого клика (потом кликаем еще раз) и всего
+SEARCH_RETRY_MS = 5000
+SEARCH_TIMEOUT_MS = 30000
+
+# Без thread_sensitive: запрос к Instagram не должен занимать общий поток, через который идут запросы к БД
+@sync_to_async(thread_sensitive=False)
 def fetch_profile_data_sync(username, relative_path_base):
     profile_url = f"https://www.instagram.com/{username}/"
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
     data = {"Username": username, "FullName": "Не найдено", "Biography": "Не найдено", "Followers": "Не найдено", "PostsCount": "Не найдено"}
     
-    try:
+    def request():
         response = requests.get(profile_url, headers=headers, timeout=10)
+        if response.status_code in ratelimit.RETRYABLE_STATUSES:
+            retry_after = ratelimit.parse_retry_after(response.headers.get('Retry-After'))
+            raise ratelimit.RetryableError(response.status_code, retry_after)
         response.raise_for_status()
+        return response
+
+    try:
+        # Лимит, AIMD и повторы с разбросом — как у остальных хостов (см. ratelimit)
+        response = ratelimit.call_sync(
+            INSTAGRAM_HOST, request, retry_on=(requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
         soup = BeautifulSoup(response.text, 'html.parser')
         
         og_description = soup.find('meta', property='og:description')
@@ -62,144 +77,166 @@ def fetch_profile_data_sync(username, relative_path_base):
         description_path_in_bucket = f"{relative_path_base}/Описание.txt"
         file_content = ContentFile(file_data_string.encode('utf-8'))
         default_storage.save(description_path_in_bucket, file_content)
-        print(f"Файл 'Описание.txt' успешно сохранен в хранилище.")
+        log(f"Файл 'Описание.txt' успешно сохранен в хранилище.")
         
-    except requests.exceptions.RequestException as e:
-        print(f"Не удалось получить данные с Instagram напрямую: {e}")
+    except (requests.exceptions.RequestException, ratelimit.RetryableError) as e:
+        log(f"Не удалось получить данные с Instagram напрямую: {e}")
+    except Exception as e:
+        log(f"Ошибка при сохранении 'Описание.txt' в R2: {e}")
+
+
+async def save_media_logged(promotion, download_url, is_video, source_key, label, indent="      "):
+    """Скачивает и сохраняет один файл; ошибки только логируются, чтобы не ронять остальные загрузки."""
+    try:
+        await downloads.save_media(promotion, download_url, is_video, source_key)
+        log(f"{indent}- {label} успешно сохранен.")
+        return True
+    except (httpx.HTTPError, ratelimit.RetryableError) as e:
+        log(f"{indent}! Не смог скачать файл ({label}): {e}")
     except Exception as e:
-        print(f"Ошибка при сохранении 'Описание.txt' в R2: {e}")
+        log(f"{indent}! Ошибка при сохранении в R2 ({label}): {e}")
+    return False
+
 
+async def save_highlight_slide(establishment, highlight_title, promotion, download_url, is_video, source_key, index):
+    """Скачивает слайд и запоминает его, чтобы в следующий раз не скачивать (при ошибке слайд останется новым)."""
+    if await has_media(promotion, source_key) or await save_media_logged(
+        promotion, download_url, is_video, source_key, f"Слайд {index+1}", indent="        "
+    ):
+        await slides.remember_slide(establishment, highlight_title, source_key, promotion)
 
-async def find_and_save_promotions(page, content_type, date_range, establishment, base_folder_path):
-    print(f"\nНачинаю работать с разделом: {content_type.upper()}")
+
+async def find_and_save_promotions(page, content_type, date_range, establishment):
+    """
+    Обрабатывает раздел (посты или сторис) конвейером: новые элементы классифицируются
+    и скачиваются, пока список еще прокручивается (см. promotions.parsing.pipeline).
+    """
+    log(f"\nНачинаю работать с разделом: {content_type.upper()}")
     start_date, end_date = date_range
+    item_selector = ITEM_SELECTOR
+    # Запоминаем список до клика: на странице еще могут быть элементы прошлой вкладки
+    before = await waits.snapshot(page, item_selector)
     try: await page.locator(f'button:has-text("{content_type}")').click()
     except Exception: return 0
-    if content_type == 'stories': await page.wait_for_timeout(8000)
-    else: await page.wait_for_timeout(5000)
-    item_selector = "li.profile-media-list__item"
-    while True:
-        all_items = await page.locator(item_selector).all()
-        if not all_items: break
-        last_item = all_items[-1]
-        date_element = last_item.locator("p.media-content__meta-time")
-        if start_date and await date_element.count() > 0:
-            date_title = await date_element.get_attribute('title')
-            last_item_date = parse_date(date_title)
-            if last_item_date and last_item_date < start_date: break
-        await last_item.scroll_into_view_if_needed()
-        await page.wait_for_timeout(2500)
-        if await page.locator(item_selector).count() == len(all_items): break
-    all_items = await page.locator(item_selector).all()
-    print(f"Всего найдено {len(all_items)}. Начинаю фильтрацию по дате ({start_date.strftime('%d.%m')} - {end_date.strftime('%d.%m')}) и анализ ИИ ({AI_MODEL_NAME}).")
+    await waits.wait_for_list_change(page, item_selector, before, content_type)
+    log(f"Фильтрую по дате ({start_date.strftime('%d.%m')} - {end_date.strftime('%d.%m')}) и анализирую ИИ ({AI_MODEL_NAME}) по мере прокрутки.")
+
+    newest_item_date = None # Новая "отметка уровня" для этого раздела
+    failed_dates = []
     promotions_found_counter = 0
-    for i, item in enumerate(all_items):
-        await asyncio.sleep(1.5)
-        date_element = item.locator("p.media-content__meta-time")
-        if await date_element.count() == 0: continue
-        date_title = await date_element.get_attribute('title')
-        item_date = parse_date(date_title)
-        if not item_date or not (start_date <= item_date <= end_date): continue
-        print(f"  + {content_type.capitalize()} от {item_date.strftime('%d.%m.%Y')} ПОДХОДИТ по дате.")
-        text_element = item.locator("p.media-content__caption")
-        if await text_element.count() == 0: text_element = item.locator(".media-content__text")
-        post_text = await text_element.inner_text() if await text_element.count() > 0 else ""
-        if not post_text.strip():
-            print(f"    - Текст отсутствует. Пропускаю.")
-            continue
-        print(f"    ? Анализирую текст с помощью ИИ: '{post_text[:70].strip()}...'")
-        is_promotion = False
-        try:
-            # ОБНОВЛЕННЫЙ ПРОМПТ С НОВЫМИ КЛЮЧЕВЫМИ СЛОВАМИ
-            prompt = (f"Текст из Instagram: {post_text}\n\n"
-                      f"Вопрос:Этот текст описывает акцию, скидку, распродажу, **ликвидацию**, **черную пятницу** (black friday) или спецпредложение?"
-                      f"Ответь только 'да' или 'нет'.")
-            completion = await ai_client.chat.completions.create(
-                model=AI_MODEL_NAME, messages=[{"role": "user", "content": prompt}],
-                max_tokens=50, 
-                temperature=0.1
-            )
-            # print(f"    DEBUG AI Response Object: {completion}")
-            ai_response = completion.choices[0].message.content.strip().lower() if completion.choices else ""
-            print(f"    > Ответ ИИ: '{ai_response}'")
-            if 'да' in ai_response: is_promotion = True
-        except APIError as e:
-            print(f"    ! Ошибка API OpenRouter: {e}. Пропускаю пост.")
-            continue
-        except Exception as e:
-            print(f"    ! Общая ошибка при вызове ИИ: {e}. Пропускаю пост.")
-            continue
-        if not is_promotion:
-            print(f"    - ИИ считает, что это НЕ акция. Пропускаю.")
-            continue
-        print(f"    АКЦИЯ ПОДТВЕРЖДЕНА ИИ!")
-        button = item.locator("a.button__download")
-        if await button.count() == 0: continue
-        create_promo_task = sync_to_async(Promotion.objects.create, thread_sensitive=True)
-        new_promo = await create_promo_task(establishment=establishment, raw_text=post_text, status='moderation')
-        promotions_found_counter += 1
-        
-        
-        download_url = await button.get_attribute('href')
-        if download_url:
-            download_task = sync_to_async(requests.get, thread_sensitive=True)
-            try:
-                if download_url.startswith('/get'): download_url = f"https://media.storiesig.info{download_url}"
-                response = await download_task(download_url)
-                response.raise_for_status() 
-                
-                is_video = await item.locator(".tags__item--video").count() > 0
-                default_ext = ".mp4" if is_video else ".jpg"
-                folder_name = 'Stories' if content_type == 'stories' else 'Posts'
-                file_name = f"promo_{new_promo.id}_{i+1}{default_ext}"
-
-                relative_path = f"{base_folder_path}/{folder_name}/{file_name}"
-                file_content = ContentFile(response.content)
-                storage_save = sync_to_async(default_storage.save, thread_sensitive=True)
-                await storage_save(relative_path, file_content)
-
-                create_media_task = sync_to_async(Media.objects.create, thread_sensitive=True)
-                await create_media_task(
-                    promotion=new_promo,
-                    file_path=relative_path, 
-                    file_type='video' if is_video else 'image'
-                )
-                print(f"      - Медиафайл ({folder_name}) успешно сохранен.")
-                
-            except requests.exceptions.RequestException as e:
-                print(f"      ! Не смог скачать файл: {e}")
-            except Exception as e:
-                print(f"      ! Ошибка при сохранении в R2: {e}") 
-                
+    folder_name = 'Stories' if content_type == 'stories' else 'Posts'
+
+    def accept(record):
+        """Отбирает элементы по дате; True — текст нужно классифицировать."""
+        nonlocal newest_item_date
+        item_date = record['date']
+        if not item_date or not (start_date <= item_date <= end_date): return False
+        newest_item_date = max(newest_item_date or item_date, item_date)
+        log(f"  + {content_type.capitalize()} от {item_date.strftime('%d.%m.%Y')} ПОДХОДИТ по дате.")
+        if not record['caption'].strip():
+            log(f"    - Текст отсутствует. Пропускаю.")
+            return False
+        return True
+
+    async def scroll(emit):
+        """Прокручивает список и сразу отдает новые элементы в очередь классификации."""
+        emitted = 0
+
+        async def emit_new():
+            nonlocal emitted
+            records = await extract_media_items(page, item_selector)
+            if len(records) > emitted:
+                for record in records[emitted:]:
+                    if accept(record):
+                        await emit(record)
+                log(f"  > Новых элементов: {len(records) - emitted} ({flow.queue_sizes()})")
+                emitted = len(records)
+            return records
+
+        while True:
+            records = await emit_new()
+            if not records: break
+            last_item_date = records[-1]['date']
+            if start_date and last_item_date and last_item_date < start_date: break
+            await page.locator(item_selector).last.scroll_into_view_if_needed()
+            if not await waits.wait_for_count_above(page, item_selector, len(records), 'scroll'): break
+        # Элементы могли догрузиться уже после потолка ожидания
+        await emit_new()
+        log(f"Прокрутка закончена, всего найдено {emitted}.")
+
+    async def classify(records):
+        log(f"  ? Анализирую {len(records)} текстов с помощью ИИ...")
+        return await classify_posts([record['caption'] for record in records])
+
+    def on_verdict(record, is_promotion):
+        post_text = record['caption']
+        if is_promotion is None:
+            # Посты, по которым ИИ не ответил, должны попасть в следующий запуск
+            failed_dates.append(record['date'])
+        elif is_promotion is False:
+            log(f"    - ИИ считает, что это НЕ акция: '{post_text[:70].strip()}...'. Пропускаю.")
+        else:
+            log(f"    АКЦИЯ ПОДТВЕРЖДЕНА ИИ: '{post_text[:70].strip()}...'")
+
+    async def save(record):
+        nonlocal promotions_found_counter
+        download_url = record['download_url']
+        if download_url is None: return
+        new_promo, created = await upsert_promotion(establishment, content_type, item_identity(record['date'], download_url), record['caption'])
+        if created:
+            promotions_found_counter += 1
+        else:
+            log(f"      = Эта акция уже сохранена ранее (#{new_promo.id}).")
+
+        source_key = media_key(download_url)
+        if await has_media(new_promo, source_key):
+            log(f"      = Медиафайл уже скачан. Пропускаю.")
+        elif not await save_media_logged(new_promo, download_url, record['is_video'], source_key, f"Медиафайл ({folder_name})"):
+            # Файл не скачался: пост должен попасть в следующий запуск, где акция получит медиа
+            failed_dates.append(record['date'])
+
+    flow = pipeline.Pipeline(content_type, scroll, classify, save, on_verdict)
+    await flow.run()
+
+    # Не сдвигаем отметку дальше самого старого поста, по которому ИИ не ответил или не скачался файл
+    if failed_dates and newest_item_date:
+        newest_item_date = min(newest_item_date, min(failed_dates))
+    await save_mark(establishment, content_type, newest_item_date.date() if newest_item_date else None)
     return promotions_found_counter
 
 
-async def find_and_save_highlights(page, establishment, base_folder_path, date_range):
+async def find_and_save_highlights(page, establishment, date_range):
     """
     Находит "Актуальное" (Highlights), анализирует их названия.
-    Если ИИ одобряет название, проверяет ДАТЫ сторис внутри.
-    Если дата подходит -> скачивает и создает акцию.
+    Если ИИ одобряет название, проверяет ДАТЫ новых (еще не скачанных) сторис внутри.
+    Если дата подходит -> скачивает и добавляет к акции этого хайлайта (или создает ее).
     """
-    print(f"\nНачинаю работать с разделом: HIGHLIGHTS")
+    log(f"\nНачинаю работать с разделом: HIGHLIGHTS")
     start_date, end_date = date_range
     
+    highlight_selector = HIGHLIGHT_SELECTOR
+    media_items_selector = ITEM_SELECTOR
+
     # 1. Переходим на вкладку
     try:
+        before = await waits.snapshot(page, highlight_selector)
         await page.locator('button:has-text("highlights")').click()
-        await page.wait_for_timeout(5000)
+        await waits.wait_for_list_change(page, highlight_selector, before, 'highlights')
     except Exception as e:
-        print(f"  ! Не удалось найти или нажать на вкладку 'Highlights': {e}")
+        log(f"  ! Не удалось найти или нажать на вкладку 'Highlights': {e}")
         return 0
 
-    highlight_selector = "li.highlight.highlights-component__highlight"
     count = await page.locator(highlight_selector).count()
 
     if count == 0:
-        print("  - 'Актуальное' (Highlights) не найдено на странице.")
+        log("  - 'Актуальное' (Highlights) не найдено на странице.")
         return 0
 
-    print(f"  Всего найдено {count} 'Актуальных'.")
+    log(f"  Всего найдено {count} 'Актуальных'.")
     promotions_found_counter = 0
+    newest_item_date = None # Новая "отметка уровня" для раздела
+    had_errors = False # При ошибках отметку не сдвигаем, чтобы не потерять слайды
+    download_tasks = [] # Скачивания идут в фоне, пока мы открываем следующие хайлайты
 
     # 2. Проходим по каждому хайлайту
     for i in range(count):
@@ -207,212 +244,621 @@ async def find_and_save_highlights(page, establishment, base_folder_path, date_r
             # Перестраховка: убеждаемся, что мы на вкладке Highlights
             if await page.locator(highlight_selector).count() == 0:
                  await page.locator('button:has-text("highlights")').click()
-                 await page.wait_for_timeout(2000)
+                 await waits.wait_for_count_above(page, highlight_selector, 0, 'highlights_tab')
 
-            # Переполучаем список (на случай если DOM обновился)
-            all_highlights = await page.locator(highlight_selector).all()
-            if i >= len(all_highlights): break
-            highlight = all_highlights[i]
+            # Переполучаем список (на случай если DOM обновился) — все названия одним запросом
+            highlight_titles = await extract_highlight_titles(page, highlight_selector)
+            if i >= len(highlight_titles): break
+            highlight = page.locator(highlight_selector).nth(i)
 
             # --- АНАЛИЗ НАЗВАНИЯ ---
-            title_element = highlight.locator("p.highlight__title")
-            if await title_element.count() == 0: continue
-            
-            highlight_title = await title_element.inner_text()
-            highlight_title = highlight_title.strip()
+            highlight_title = highlight_titles[i]
             if not highlight_title: continue
 
-            print(f"    [{i+1}/{count}] Анализирую название '{highlight_title}'...")
+            log(f"    [{i+1}/{count}] Анализирую название '{highlight_title}'...")
 
-            is_promotion = False
-            try:
-                prompt = (f"Название 'Актуального' (Highlights) в Instagram: {highlight_title}\n\n"
-                          f"Вопрос: Судя по этому названию (например, 'Акции', 'Sale', 'Скидки', 'Offers'), в этом разделе могут содержаться акции, скидки, распродажи, ликвидации или спецпредложения? "
-                          f"Ответь только 'да' или 'нет'.")
-                
-                completion = await ai_client.chat.completions.create(
-                    model=AI_MODEL_NAME, messages=[{"role": "user", "content": prompt}],
-                    max_tokens=50, 
-                    temperature=0.1
-                )
-                ai_response = completion.choices[0].message.content.strip().lower() if completion.choices else ""
-                if 'да' in ai_response: 
-                    is_promotion = True
-            except Exception:
-                pass 
+            is_promotion = await classify_highlight_title(highlight_title)
 
             if not is_promotion:
-                print(f"      - ИИ: Нет.")
+                log(f"      - ИИ: Нет.")
                 continue
 
-            print(f"      + ИИ: ДА! Открываю хайлайт...")
+            log(f"      + ИИ: ДА! Открываю хайлайт...")
 
             # --- ОТКРЫТИЕ ХАЙЛАЙТА (Подгрузка контента) ---
             # Клик по кнопке внутри li вызывает подгрузку контента ниже
+            before = await waits.snapshot(page, media_items_selector)
             await highlight.locator("button.highlight__button").click()
-            await page.wait_for_timeout(6000) # Ждем загрузки контента
+            await waits.wait_for_list_change(page, media_items_selector, before, 'highlight_open') # Ждем загрузки контента
 
             # Ищем подгруженные элементы (они такие же, как в Posts/Stories)
-            media_items_selector = "li.profile-media-list__item"
-            media_items = await page.locator(media_items_selector).all()
+            media_items = await extract_media_items(page, media_items_selector)
             
             if not media_items:
-                print("      ! Контент не загрузился или пуст.")
+                log("      ! Контент не загрузился или пуст.")
                 # Скроллим вверх на всякий случай
                 await page.evaluate("window.scrollTo(0, 0)")
                 continue
 
+            # --- ОТСЕВ ИЗВЕСТНЫХ СЛАЙДОВ ---
+            # Слайды, скачанные в прошлые запуски, не проверяем и не скачиваем заново
+            keyed_items = [(record, media_key(record['download_url'])) for record in media_items if record['download_url']]
+            known = await slides.known_slides(establishment, highlight_title, [key for _, key in keyed_items])
+            new_items = [(record, key) for record, key in keyed_items if key not in known]
+            log(f"      Найдено {len(media_items)} слайдов, новых: {len(new_items)}. Проверяю даты ({start_date.strftime('%d.%m')} - {end_date.strftime('%d.%m')})...")
+
             # --- ПРОВЕРКА ДАТЫ И СБОР ФАЙЛОВ ---
-            valid_media_to_save = [] # Список кортежей (media_item_locator, media_index)
-
-            print(f"      Найдено {len(media_items)} слайдов. Проверяю даты ({start_date.strftime('%d.%m')} - {end_date.strftime('%d.%m')})...")
-
-            for media_index, media_item in enumerate(media_items):
-                date_element = media_item.locator("p.media-content__meta-time")
-                if await date_element.count() == 0: continue
-                
-                date_title = await date_element.get_attribute('title')
-                item_date = parse_date(date_title)
-                
-                if item_date and (start_date <= item_date <= end_date):
-                    # Дата подходит!
-                    valid_media_to_save.append((media_item, media_index))
-                # Если дата НЕ подходит, мы просто пропускаем этот слайд.
-                # Мы НЕ прерываем цикл (break), потому что в Хайлайте старые и новые сторис могут быть перемешаны
-                # (хотя обычно они по порядку, но лучше перестраховаться).
-
-            if not valid_media_to_save:
-                print(f"      - В этом хайлайте нет свежих акций (все старые). Пропускаю.")
+            # Мы НЕ прерываем проверку на первом старом слайде, потому что в Хайлайте старые и новые сторис могут быть перемешаны
+            # (хотя обычно они по порядку, но лучше перестраховаться).
+            slides_to_save = [
+                (record, key) for record, key in new_items
+                if record['date'] and start_date <= record['date'] <= end_date
+            ]
+
+            if not slides_to_save:
+                log(f"      - В этом хайлайте нет новых свежих слайдов. Пропускаю.")
                 # Возвращаемся наверх
                 await page.evaluate("window.scrollTo(0, 0)")
                 continue
 
-            # --- СОЗДАНИЕ АКЦИИ И СКАЧИВАНИЕ ---
-            print(f"      + Найдено {len(valid_media_to_save)} свежих слайдов! Создаю акцию...")
-            
-            create_promo_task = sync_to_async(Promotion.objects.create, thread_sensitive=True)
-            new_promo = await create_promo_task(
-                establishment=establishment, 
-                raw_text=f"Акция из 'Актуального'. Название: {highlight_title}", 
-                status='moderation'
-            )
-            promotions_found_counter += 1
+            for record, _ in slides_to_save:
+                newest_item_date = max(newest_item_date or record['date'], record['date'])
+
+            # --- АКЦИЯ: ТА ЖЕ, ЧТО У ИЗВЕСТНЫХ СЛАЙДОВ, ИЛИ НОВАЯ ---
+            new_promo = await slides.current_promotion(known)
+            if new_promo:
+                log(f"      + Найдено {len(slides_to_save)} новых слайдов, добавляю к акции #{new_promo.id}...")
+            else:
+                log(f"      + Найдено {len(slides_to_save)} свежих слайдов! Создаю акцию...")
+                slides_hash = hashlib.sha256("|".join(sorted(key for _, key in slides_to_save)).encode('utf-8')).hexdigest()
+                new_promo, created = await upsert_promotion(
+                    establishment, 'highlights', f"{highlight_title}|{slides_hash}"[:255],
+                    f"Акция из 'Актуального'. Название: {highlight_title}"
+                )
+                if created:
+                    promotions_found_counter += 1
+                else:
+                    log(f"      = Эта акция уже сохранена ранее (#{new_promo.id}).")
 
-            # Скачиваем только валидные файлы
-            for media_item, original_index in valid_media_to_save:
-                button = media_item.locator("a.button__download")
-                if await button.count() == 0: continue
-
-                download_url = await button.get_attribute('href')
-                if download_url:
-                    download_task = sync_to_async(requests.get, thread_sensitive=True)
-                    try:
-                        if download_url.startswith('/get'): download_url = f"https://media.storiesig.info{download_url}"
-                        response = await download_task(download_url)
-                        response.raise_for_status() 
-                        
-                        is_video = await media_item.locator(".tags__item--video").count() > 0
-                        default_ext = ".mp4" if is_video else ".jpg"
-                        
-                        safe_title = "".join(c for c in highlight_title if c.isalnum() or c in (' ', '_')).rstrip().replace(' ', '_')
-                        if not safe_title: safe_title = f"highlight_{new_promo.id}"
-                        
-                        # Сохраняем структуру: Highlights / Название Хайлайта / Файл
-                        relative_path = f"{base_folder_path}/Highlights/{safe_title}/promo_{new_promo.id}_{original_index+1}{default_ext}"
-
-                        file_content = ContentFile(response.content)
-                        storage_save = sync_to_async(default_storage.save, thread_sensitive=True)
-                        await storage_save(relative_path, file_content)
-
-                        create_media_task = sync_to_async(Media.objects.create, thread_sensitive=True)
-                        await create_media_task(
-                            promotion=new_promo,
-                            file_path=relative_path, 
-                            file_type='video' if is_video else 'image'
-                        )
-                        print(f"        - Слайд {original_index+1} сохранен.")
-                    except Exception as e:
-                        print(f"        ! Ошибка сохранения слайда {original_index+1}: {e}")
+            # Скачиваем только новые файлы (параллельно)
+            for record, source_key in slides_to_save:
+                download_tasks.append(asyncio.create_task(save_highlight_slide(
+                    establishment, highlight_title, new_promo, record['download_url'], record['is_video'], source_key, record['index']
+                )))
 
             # После обработки хайлайта, обязательно скроллим вверх, 
             # чтобы меню с кружками снова стало видно и Playwright мог кликнуть следующий.
             await page.evaluate("window.scrollTo(0, 0)")
-            await page.wait_for_timeout(1000)
+            await waits.wait_for_visible(page, highlight_selector, 'scroll_up')
 
         except Exception as e:
-            print(f"    ! Ошибка на хайлайте #{i}: {e}")
+            log(f"    ! Ошибка на хайлайте #{i}: {e}")
+            had_errors = True
             await page.evaluate("window.scrollTo(0, 0)") # На всякий случай скроллим вверх
             continue
-            
+
+    if download_tasks:
+        await asyncio.gather(*download_tasks)
+    if not had_errors:
+        await save_mark(establishment, 'highlights', newest_item_date.date() if newest_item_date else None)
     return promotions_found_counter
 
 
 class Command(BaseCommand):
     help = 'Запускает парсинг аккаунтов Instagram для сбора акций за последние 7 дней'
+    # Пересоздавать контекст браузера после стольких профилей (None — никогда)
+    recycle_after = None
+    # Пересоздавать контекст, если занято больше стольких МБ памяти (None — не проверять)
+    memory_limit_mb = None
+    # Свой шард (i, n) и ключ запуска для аренды заведений (None — без шардов и аренды)
+    shard = None
+    run_key = None
+    # Текущий запуск (ParseRun) и его контрольные точки {id заведения: (завершено, {раздел: акций})}
+    run = None
+    run_progress = {}
+    # Сессия StoriesIG (куки и шаблон прямой ссылки, см. promotions.parsing.session)
+    session = None
+    session_saved = False
+
     def add_arguments(self, parser):
         parser.add_argument('account_id', nargs='?', type=int, help='ID конкретного заведения для парсинга')
+        parser.add_argument('--ids', type=int, nargs='+', help='ID заведений для парсинга')
+        parser.add_argument('--city', type=int, help='Парсить только заведения этого города (ID)')
+        parser.add_argument('--subcategory', type=int, help='Парсить только заведения этой подкатегории (ID)')
+        parser.add_argument('--category', type=int, help='Парсить только заведения этой категории (ID)')
+        parser.add_argument('--stale-hours', type=float,
+                            help='Парсить только заведения, которые не парсились столько часов')
+        parser.add_argument('--shard', help='Парсить только свою часть заведений: i/n (i от 0 до n-1), по хэшу ника')
+        parser.add_argument('--lease', action='store_true',
+                            help='Делить запуск с другими процессами через аренду заведений в БД')
+        parser.add_argument('--run-key',
+                            help='Ключ запуска для аренды (по умолчанию — дата и параметры выборки); включает --lease')
+        parser.add_argument('--resume', metavar='RUN_ID',
+                            help='Продолжить прерванный запуск с контрольной точки (выборка и опции берутся из него)')
+        self.add_parse_options(parser)
+
+    def add_parse_options(self, parser):
+        """Опции парсинга, общие для parse_instagram и parser_worker."""
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Сколько профилей парсить одновременно (у каждого свой контекст браузера)')
+        parser.add_argument('--ai-concurrency', type=int, default=classifier.AI_CONCURRENCY,
+                            help='Сколько запросов к ИИ может идти одновременно')
+        parser.add_argument('--ai-batch-size', type=int, default=classifier.AI_BATCH_SIZE,
+                            help='Сколько текстов отправлять ИИ в одном запросе (1 = без пакетов)')
+        parser.add_argument('--full', action='store_true',
+                            help='Игнорировать отметки прошлых запусков и разобрать все окно в 30 дней')
+        parser.add_argument('--block-resources', action='store_true',
+                            help='Не загружать в браузере картинки, видео, шрифты и рекламу (нужен только DOM)')
+        parser.add_argument('--no-local-model', action='store_true',
+                            help='Не использовать локальный классификатор, все тексты решает ИИ')
+        parser.add_argument('--sequential-sections', action='store_true',
+                            help='Обрабатывать посты, сторис и актуальное по очереди на одной странице '
+                                 '(меньше памяти; по умолчанию — одновременно на трех страницах)')
+
     def handle(self, *args, **kwargs):
-        self.today = datetime.now()
+        self.configure(**kwargs)
+        if kwargs.get('resume'):
+            selection = self.resume_run(kwargs['resume'])
+        else:
+            selection = self.start_run(**kwargs)
+        asyncio.run(self.async_handle(selection, self.concurrency))
+
+    def start_run(self, **kwargs):
+        """Новый запуск: разбирает выборку, шард и аренду и создает ParseRun для контрольных точек."""
+        selection = selection_params(kwargs)
+        if kwargs.get('account_id'):
+            selection['ids'] = [kwargs['account_id'], *selection.get('ids', [])]
+        if kwargs.get('shard'):
+            try:
+                self.shard = parse_shard(kwargs['shard'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        if kwargs.get('run_key') or kwargs.get('lease'):
+            self.run_key = kwargs.get('run_key') or f"{self.today.strftime('%Y-%m-%d')}-{make_dedupe_key(selection)[:16]}"
+        self.run = checkpoints.start_run_sync({
+            'selection': selection, 'full': self.full,
+            'shard': list(self.shard) if self.shard else None, 'run_key': self.run_key,
+        })
+        return selection
+
+    def resume_run(self, run_id):
+        """Продолжение запуска: те же выборка, опции и окно дат, что и в начале."""
+        self.run = checkpoints.load_run_sync(run_id)
+        if self.run is None:
+            raise CommandError(f"Запуск {run_id} не найден.")
+        params = self.run.params
+        self.full = params.get('full', False)
+        self.shard = tuple(params['shard']) if params.get('shard') else None
+        self.run_key = params.get('run_key')
+        # Окно дат и папки в хранилище — от даты начала запуска, а не от сегодняшней
+        self.set_dates(timezone.localtime(self.run.started_at).replace(tzinfo=None))
+        self.stdout.write(f"Продолжаю запуск {run_id} от {self.today.strftime('%Y-%m-%d %H:%M')}.")
+        return params.get('selection', {})
+
+    def configure(self, **kwargs):
+        """Применяет опции командной строки."""
+        self.set_dates()
+        self.concurrency = max(1, kwargs.get('concurrency') or 1)
+        classifier.configure(concurrency=kwargs.get('ai_concurrency'), batch_size=kwargs.get('ai_batch_size'))
+        self.use_local_model = not kwargs.get('no_local_model')
+        self.full = kwargs.get('full', False)
+        self.block_resources = kwargs.get('block_resources', False)
+        self.parallel_sections = not kwargs.get('sequential_sections')
+
+    def set_dates(self, today=None):
+        self.today = today or datetime.now()
         self.end_date = datetime.combine(self.today, time.max)
         self.start_date = self.end_date - timedelta(days=30)
-        account_id = kwargs.get('account_id')
-        asyncio.run(self.async_handle(account_id))
-        
-    async def async_handle(self, account_id):
-        if account_id:
-            query = Establishment.objects.select_related('city__country').filter(pk=account_id)
-        else:
-            query = Establishment.objects.select_related('city__country').all()
+
+    def write(self, message, style=None):
+        """Пишет в stdout с префиксом текущего профиля."""
+        message = tag(message)
+        self.stdout.write(style(message) if style else message)
+
+    async def get_establishments(self, selection):
+        """Заведения по параметрам выборки (см. promotions.parsing.selection)."""
         get_establishments = sync_to_async(list, thread_sensitive=True)
-        establishments = await get_establishments(query)
+        return in_shard(await get_establishments(select_establishments(**selection)), self.shard)
+
+    async def load_local_model(self):
+        if self.use_local_model:
+            if await classifier.load_local_model():
+                self.stdout.write("Локальный классификатор загружен: в ИИ уйдут только сомнительные тексты.")
+            else:
+                self.stdout.write("Локальный классификатор не обучен (manage.py train_promo_classifier), все тексты решает ИИ.")
+        
+    async def async_handle(self, selection, concurrency=1):
+        establishments = await self.get_establishments(selection)
         if not establishments:
             self.stdout.write(self.style.WARNING('Не найдено заведений для парсинга.'))
             return
-        self.stdout.write(f"Начинаем парсинг с {self.start_date.strftime('%Y-%m-%d')} по {self.end_date.strftime('%Y-%m-%d')}...")
+        self.stdout.write(f"Выборка: {describe(selection)} — {len(establishments)} заведений.")
+        if self.shard:
+            self.stdout.write(f"Шард {self.shard[0]}/{self.shard[1]}.")
+        if self.run_key:
+            self.stdout.write(f"Аренда заведений включена, ключ запуска: {self.run_key}")
+        await self.load_checkpoints()
+        await self.load_local_model()
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            page = await context.new_page()
+            self.browser = await p.chromium.launch(headless=True)
             try:
-                await page.goto("https://storiesig.info/en/")
-                for establishment in establishments:
-                    username = establishment.instagram_url.strip('/').split('/')[-1]
-                    self.stdout.write(self.style.MIGRATE_HEADING(f"\n--- Работаю с профилем: {username} ---"))
-                    
-                    base_folder_path = (
-                        f"{establishment.city.country.name}/{establishment.city.name}/"
-                        f"{username}/{self.today.strftime('%Y-%m-%d')}"
-                    )
-                    
-                    await fetch_profile_data_sync(username, base_folder_path)
-                    
-                    self.stdout.write("Шаг 2: Ищу профиль на StoriesIG...")
-                    await page.locator("input.search.search-form__input").fill(username)
-                    try:
-                        async with context.expect_page(timeout=5000) as new_page_info:
-                            await page.locator("button.search-form__button").click()
-                        new_page = await new_page_info.value
-                        await new_page.close()
-                    except TimeoutError:
-                        await page.locator("button.search-form__button").click()
-                    try:
-                        await page.wait_for_selector("div.search-result", timeout=30000)
-                        self.stdout.write("Профиль найден, начинаю поиск акций.")
-                    except TimeoutError:
-                        self.stdout.write(self.style.ERROR(f"Не удалось найти профиль {username}."))
-                        await page.goto("https://storiesig.info/en/")
-                        continue
-                        
-                    posts_promo_count = await find_and_save_promotions(page, 'posts', (self.start_date, self.end_date), establishment, base_folder_path)
-                    stories_promo_count = await find_and_save_promotions(page, 'stories', (self.start_date, self.end_date), establishment, base_folder_path)
-                    
-                    # Передаем date_range в функцию хайлайтов!
-                    highlights_promo_count = await find_and_save_highlights(page, establishment, base_folder_path, (self.start_date, self.end_date))
-                    
-                    message = f"Готово для {username}. Найдено акций: {posts_promo_count} (посты), {stories_promo_count} (сторис), {highlights_promo_count} (актуальное)."
-
-                    self.stdout.write(self.style.SUCCESS(message))
-                    await page.goto("https://storiesig.info/en/")
+                pool = await self.open_pool(min(concurrency, len(establishments)))
+                await self.run_establishments(pool, establishments)
+                await checkpoints.finish_run(self.run)
             finally:
-                await browser.close()
-                self.stdout.write(self.style.SUCCESS('\nПарсинг всех заведений успешно завершен!'))
\ No newline at end of file
+                await self.browser.close()
+                await downloads.close()
+                derivatives.shutdown()
+                await self.report_cache()
+                self.stdout.write(self.style.SUCCESS('\nПарсинг всех заведений успешно завершен!'))
+
+    async def load_checkpoints(self):
+        if not self.run:
+            self.run_progress = {}
+            return
+        self.run_progress = await checkpoints.load_checkpoints(self.run)
+        completed = sum(1 for done, _ in self.run_progress.values() if done)
+        self.stdout.write(f"Запуск {self.run.run_id} (после сбоя: --resume {self.run.run_id}).")
+        if completed:
+            self.stdout.write(f"Уже обработано в этом запуске: {completed} заведений, они будут пропущены.")
+
+    async def open_pool(self, size):
+        """
+        Пул страниц: у каждого "слота" свой контекст, чтобы всплывающие окна
+        и куки одного профиля не мешали другому.
+        """
+        if self.session is None:
+            self.session = await session.load()
+            if self.session.get('storage_state'):
+                self.stdout.write(f"Сессия StoriesIG загружена (сохранена {self.session.get('saved_at', '?')}).")
+        pool = asyncio.Queue()
+        for _ in range(size):
+            pool.put_nowait(await self.open_slot())
+        if size > 1:
+            self.stdout.write(f"Параллельный режим: {size} профиля(ей) одновременно.")
+        if self.parallel_sections:
+            self.stdout.write(f"Разделы профиля обрабатываются одновременно ({len(SECTIONS)} страницы на контекст).")
+        return pool
+
+    async def open_slot(self):
+        # Куки и согласия с прошлых запусков: сайт не показывает баннеры заново
+        context = await self.browser.new_context(storage_state=self.session.get('storage_state'))
+        context.on("page", session.close_popup)
+        blocker = None
+        if self.block_resources:
+            blocker = ResourceBlocker()
+            await blocker.install(context)
+        # 429/5xx, которые получает сама страница, тоже снижают скорость запросов к хосту
+        context.on("response", ratelimit.observe_response)
+        page = await context.new_page()
+        return {'context': context, 'page': page, 'blocker': blocker, 'profiles': 0}
+
+    async def goto_home(self, page):
+        await ratelimit.acquire(STORIESIG_HOST)
+        await page.goto(STORIESIG_URL)
+
+    async def close_slot(self, slot):
+        try:
+            await slot['context'].close()
+        except Exception:
+            pass
+
+    def should_recycle(self, slot):
+        """Пора ли пересоздать контекст: после N профилей или при нехватке памяти."""
+        if self.recycle_after and slot['profiles'] >= self.recycle_after:
+            return True
+        if self.memory_limit_mb:
+            used = memory_used_mb()
+            if used is not None and used >= self.memory_limit_mb:
+                return True
+        return False
+
+    async def run_establishments(self, pool, establishments):
+        self.stdout.write(f"Начинаем парсинг с {self.start_date.strftime('%Y-%m-%d')} по {self.end_date.strftime('%Y-%m-%d')}...")
+        # Каждый слот берет следующее заведение, только когда освободился: аренду (--lease)
+        # процесс берет на то, что парсит сейчас, а не на весь список сразу
+        queue = iter(establishments)
+        await asyncio.gather(*(self.slot_worker(pool, queue) for _ in range(pool.qsize())))
+
+    def date_range_for(self, marks, section):
+        """
+        Окно дат для раздела: от отметки прошлого запуска (включительно —
+        в тот же день могли появиться новые посты), но не раньше 30 дней назад.
+        """
+        start_date = self.start_date
+        mark = marks.get(section)
+        if mark:
+            start_date = max(start_date, datetime.combine(mark, time.min))
+        return (start_date, self.end_date)
+
+    def reset_stats(self):
+        """Обнуляет счетчики запуска (воркер живет долго и вызывает это перед каждым заданием)."""
+        for counters in (cache.stats, classifier.stats, downloads.stats, highlight_titles.stats):
+            for key in counters:
+                counters[key] = 0
+        for counters in (ratelimit.stats, waits.stats, pipeline.stats, pipeline.queue_peaks):
+            counters.clear()
+
+    async def report_cache(self):
+        """Печатает статистику кэша ответов ИИ и чистит устаревшие записи."""
+        self.stdout.write(f"Кэш ИИ: попаданий {cache.stats['hits']}, промахов {cache.stats['misses']}.")
+        wait_lines = waits.report()
+        if wait_lines:
+            self.stdout.write("Время ожиданий на странице:\n" + "\n".join(wait_lines))
+        if downloads.stats['reused']:
+            self.stdout.write(f"Хранилище: {downloads.stats['reused']} файлов уже были загружены, "
+                              f"сэкономлено {downloads.stats['saved_bytes'] / 1024 / 1024:.1f} МБ.")
+        rate_lines = ratelimit.report()
+        if rate_lines:
+            self.stdout.write("Лимиты запросов к хостам:\n" + "\n".join(rate_lines))
+        pipeline_lines = pipeline.report()
+        if pipeline_lines:
+            self.stdout.write("Конвейер (прокрутка → классификация → скачивание):\n" + "\n".join(pipeline_lines))
+        self.stdout.write(f"Классификация: локальной моделью {classifier.stats['local']}, через ИИ {classifier.stats['ai']}.")
+        self.stdout.write(f"Названия 'Актуального': по таблице {highlight_titles.stats['table']}, через ИИ {highlight_titles.stats['ai']}.")
+        try:
+            evicted = await cache.evict()
+            if evicted:
+                self.stdout.write(f"Кэш ИИ: удалено устаревших записей: {evicted}.")
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"Не удалось очистить кэш ИИ: {e}"))
+
+    async def slot_worker(self, pool, queue):
+        """Берет свободный слот из пула и парсит им заведения из общей очереди, пока они не кончатся."""
+        slot = await pool.get()
+        try:
+            for establishment in queue:
+                slot = await self.process_in_slot(slot, establishment)
+        finally:
+            # Слот возвращаем всегда (воркер переиспользует пул в следующем задании)
+            pool.put_nowait(slot)
+
+    async def process_in_slot(self, slot, establishment):
+        """Парсит профиль в слоте и возвращает слот, готовый к следующему профилю."""
+        if self.run_progress.get(establishment.id, (False, {}))[0]:
+            return slot
+        if self.run_key and not await leases.acquire(self.run_key, establishment):
+            self.stdout.write(f"{establishment.instagram_url}: уже обработан или обрабатывается другим процессом, пропускаю.")
+            return slot
+        blocker = slot['blocker']
+        username = establishment.instagram_url.strip('/').split('/')[-1]
+        current_profile.set(username)
+        if blocker:
+            blocker.reset()
+        result = {'username': username, 'error': ''}
+        started = monotonic()
+        renewal = asyncio.ensure_future(self.renew_lease(establishment)) if self.run_key else None
+        try:
+            result.update(await self.process_establishment(slot, establishment, username))
+            if not result['error']:
+                await mark_parsed(establishment)
+                if self.run:
+                    await checkpoints.complete_establishment(self.run, establishment)
+        except Exception as e:
+            # Ошибка одного профиля не должна останавливать остальные
+            self.write(f"Ошибка при парсинге профиля {username}: {e}", self.style.ERROR)
+            result['error'] = str(e)
+        finally:
+            if renewal:
+                renewal.cancel()
+            if blocker:
+                self.write(blocker.summary())
+            result['seconds'] = round(monotonic() - started, 1)
+            slot['profiles'] += 1
+            try:
+                if self.run_key:
+                    # После ошибки отдаем заведение, чтобы его мог повторить другой процесс
+                    await (leases.release if result['error'] else leases.complete)(self.run_key, establishment)
+                await self.establishment_done(establishment, result)
+            except Exception as e:
+                self.write(f"Не удалось записать прогресс: {e}", self.style.WARNING)
+        return await self.reset_slot(slot)
+
+    async def renew_lease(self, establishment):
+        """Продлевает аренду, пока профиль парсится, чтобы ее не забрал другой процесс."""
+        while True:
+            await asyncio.sleep(leases.RENEW_SECONDS)
+            try:
+                if not await leases.renew(self.run_key, establishment):
+                    self.write("Аренда заведения потеряна (ее забрал другой процесс).", self.style.WARNING)
+                    return
+            except Exception as e:
+                self.write(f"Не удалось продлить аренду: {e}", self.style.WARNING)
+
+    async def establishment_done(self, establishment, result):
+        """Вызывается после каждого профиля (в воркере — для прогресса задания)."""
+
+    async def reset_slot(self, slot):
+        """
+        Проверяет, что страница слота жива (следующий профиль она откроет сама, см. open_profile),
+        а при необходимости пересоздает контекст.
+        """
+        if self.should_recycle(slot):
+            self.write(f"Пересоздаю контекст браузера (профилей в контексте: {slot['profiles']}).")
+            await self.close_slot(slot)
+            try:
+                return await self.open_slot()
+            except Exception as e:
+                self.write(f"Не удалось создать новый контекст: {e}", self.style.ERROR)
+                return slot
+        page = slot['page']
+        try:
+            await page.evaluate("1")
+        except Exception:
+            # Страница могла упасть — заменяем ее новой в том же контексте
+            try:
+                await page.close()
+                slot['page'] = await slot['context'].new_page()
+            except Exception as e:
+                self.write(f"Не удалось восстановить страницу: {e}", self.style.ERROR)
+        return slot
+
+    def profile_url_template(self):
+        return session.PROFILE_URL_TEMPLATE or self.session.get('profile_url_template')
+
+    async def open_profile(self, page, username):
+        """
+        Открывает результаты по профилю на этой странице: сразу по прямой ссылке, если
+        она известна, иначе через форму поиска. Возвращает True, если результаты загрузились.
+        """
+        template = self.profile_url_template()
+        direct_failed = False
+        if template:
+            await ratelimit.acquire(STORIESIG_HOST)
+            try:
+                await page.goto(session.profile_url(template, username))
+                await page.wait_for_selector("div.search-result", timeout=SEARCH_TIMEOUT_MS)
+                await ratelimit.report_success(STORIESIG_HOST)
+                return True
+            except PlaywrightError as e:
+                self.write(f"Прямая ссылка на профиль не сработала ({e.__class__.__name__}), ищу через форму.")
+                direct_failed = True
+
+        await self.goto_home(page)
+        await page.locator("input.search.search-form__input").fill(username)
+        await ratelimit.acquire(STORIESIG_HOST)
+        # Рекламные окна закрывает обработчик session.close_popup, ждать их не нужно
+        await page.locator("button.search-form__button").click()
+        try:
+            await page.wait_for_selector("div.search-result", timeout=SEARCH_RETRY_MS)
+        except TimeoutError:
+            # Первый клик мог уйти в рекламу — повторяем
+            await page.locator("button.search-form__button").click()
+            try:
+                await page.wait_for_selector("div.search-result", timeout=SEARCH_TIMEOUT_MS - SEARCH_RETRY_MS)
+            except TimeoutError:
+                return False
+        await ratelimit.report_success(STORIESIG_HOST)
+        if direct_failed:
+            # Профиль существует, а по ссылке не открылся — значит, не годится шаблон
+            await self.forget_template(template)
+        await self.remember_session(page, username)
+        return True
+
+    async def remember_session(self, page, username):
+        """
+        После первого успешного поиска сохраняет куки/согласия браузера и, если в адресе
+        результатов есть ник, шаблон прямой ссылки — для следующих профилей и запусков.
+        """
+        template = None
+        if not session.PROFILE_URL_TEMPLATE:
+            template = session.learn_template(page.url, username, STORIESIG_URL)
+            if template in self.session.get('rejected_templates', []):
+                template = None
+        if self.session_saved and not template:
+            return
+        self.session_saved = True
+        if template and template != self.session.get('profile_url_template'):
+            self.write(f"Профили будут открываться по прямой ссылке: {template}")
+            self.session['profile_url_template'] = template
+        try:
+            self.session['storage_state'] = await page.context.storage_state()
+            await session.save(self.session)
+        except Exception as e:
+            self.write(f"Не удалось сохранить сессию StoriesIG: {e}", self.style.WARNING)
+
+    async def forget_template(self, template):
+        """Отбрасывает шаблон прямой ссылки, по которому результаты не загрузились."""
+        if self.session.get('profile_url_template') != template:
+            return
+        self.session.pop('profile_url_template', None)
+        rejected = self.session.setdefault('rejected_templates', [])
+        if template not in rejected:
+            rejected.append(template)
+        try:
+            await session.save(self.session)
+        except Exception as e:
+            self.write(f"Не удалось сохранить сессию StoriesIG: {e}", self.style.WARNING)
+
+    async def open_section_page(self, slot, index, username):
+        """
+        Дополнительная страница слота для раздела (в том же контексте) с уже открытым профилем.
+        Страницы живут, пока жив контекст, и переиспользуются для следующих профилей.
+        """
+        pages = slot.setdefault('section_pages', [])
+        if index >= len(pages):
+            pages.append(await slot['context'].new_page())
+        elif pages[index].is_closed():
+            pages[index] = await slot['context'].new_page()
+        page = pages[index]
+        if not await self.open_profile(page, username):
+            raise RuntimeError("профиль не найден на дополнительной странице")
+        return page
+
+    async def plan_lanes(self, slot, sections, username):
+        """
+        Раскладывает разделы по страницам: первый — на основной странице, остальные —
+        каждый на своей. Если дополнительную страницу открыть не удалось, ее раздел
+        выполняется на основной странице после своего.
+        """
+        lanes = [(slot['page'], [sections[0]])]
+        opened = await asyncio.gather(
+            *(self.open_section_page(slot, n, username) for n in range(len(sections) - 1)), return_exceptions=True
+        )
+        for section, page in zip(sections[1:], opened):
+            if isinstance(page, Exception):
+                self.write(f"Не удалось открыть отдельную страницу для раздела {section} ({page}), он пойдет после {sections[0]}.")
+                lanes[0][1].append(section)
+            else:
+                lanes.append((page, [section]))
+        return lanes
+
+    async def run_lane(self, page, sections, establishment, marks, counts):
+        """Обрабатывает разделы одной страницы по очереди и записывает контрольную точку после каждого."""
+        for section in sections:
+            date_range = self.date_range_for(marks, section)
+            if section == 'highlights':
+                counts[section] = await find_and_save_highlights(page, establishment, date_range)
+            else:
+                counts[section] = await find_and_save_promotions(page, section, date_range, establishment)
+            if self.run:
+                await checkpoints.save_section(self.run, establishment, section, counts[section])
+
+    async def process_establishment(self, slot, establishment, username):
+        self.write(f"\n--- Работаю с профилем: {username} ---", self.style.MIGRATE_HEADING)
+        
+        base_folder_path = (
+            f"{establishment.city.country.name}/{establishment.city.name}/"
+            f"{username}/{self.today.strftime('%Y-%m-%d')}"
+        )
+        
+        await fetch_profile_data_sync(username, base_folder_path)
+        
+        self.write("Шаг 2: Ищу профиль на StoriesIG...")
+        if not await self.open_profile(slot['page'], username):
+            self.write(f"Не удалось найти профиль {username}.", self.style.ERROR)
+            return {'error': 'Профиль не найден на StoriesIG'}
+        self.write("Профиль найден, начинаю поиск акций.")
+            
+        marks = {} if self.full else await get_marks(establishment)
+
+        # Разделы, обработанные до сбоя, при --resume пропускаем
+        sections_done = self.run_progress.get(establishment.id, (False, {}))[1]
+        counts = {}
+        sections = []
+        for section in SECTIONS:
+            if section in sections_done:
+                self.write(f"Раздел {section} уже обработан в этом запуске, пропускаю.")
+                counts[section] = sections_done[section]
+            else:
+                sections.append(section)
+
+        if len(sections) > 1 and self.parallel_sections:
+            # Разделы идут одновременно на отдельных страницах одного контекста;
+            # классификация и скачивание у них общие (семафор ИИ, пул соединений)
+            lanes = await self.plan_lanes(slot, sections, username)
+        else:
+            lanes = [(slot['page'], sections)] if sections else []
+        results = await asyncio.gather(
+            *(self.run_lane(page, lane_sections, establishment, marks, counts) for page, lane_sections in lanes),
+            return_exceptions=True,
+        )
+        # Ошибка одного раздела не прерывает остальные, но профиль считается упавшим
+        for error in results:
+            if isinstance(error, BaseException):
+                raise error
+        
+        message = f"Готово для {username}. Найдено акций: {counts['posts']} (посты), {counts['stories']} (сторис), {counts['highlights']} (актуальное)."
+
+        self.write(message, self.style.SUCCESS)
+        return counts
@@ -0,0 +1,122 @@
+import asyncio
+import traceback
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from playwright.async_api import async_playwright
+
+from promotions.management.commands.parse_instagram import Command as ParseCommand
+from promotions import derivatives
+from promotions.parsing import checkpoints, downloads, jobs
+from promotions.parsing.selection import describe, selection_params
+
+
+class Command(ParseCommand):
+    help = 'Долгоживущий воркер парсинга: держит Chromium "теплым" и выполняет задания из очереди (ParseJob)'
+
+    def add_arguments(self, parser):
+        self.add_parse_options(parser)
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Как часто (в секундах) проверять очередь, когда она пуста')
+        parser.add_argument('--recycle-after', type=int, default=50,
+                            help='Пересоздавать контекст браузера после стольких профилей (0 = никогда)')
+        parser.add_argument('--memory-limit-mb', type=int, default=800,
+                            help='Пересоздавать контекст, если на машине занято больше стольких МБ (0 = не проверять)')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить все задания из очереди и завершиться')
+
+    def handle(self, *args, **kwargs):
+        self.configure(**kwargs)
+        self.poll_interval = kwargs['poll_interval']
+        self.recycle_after = kwargs['recycle_after'] or None
+        self.memory_limit_mb = kwargs['memory_limit_mb'] or None
+        self.once = kwargs['once']
+        self.defaults = {'full': self.full}
+        asyncio.run(self.worker_loop())
+
+    async def worker_loop(self):
+        await self.load_local_model()
+        async with async_playwright() as p:
+            self.playwright = p
+            await self.start_browser()
+            self.stdout.write(self.style.SUCCESS(f"Воркер запущен: {self.concurrency} контекст(ов) браузера готовы."))
+            if isinstance(default_storage, FileSystemStorage):
+                # Файлы лягут на диск этой машины: веб-сервер на другой машине их не увидит
+                self.stdout.write(self.style.WARNING(
+                    "Медиафайлы сохраняются на локальный диск. Если воркер работает на отдельной машине, "
+                    "задайте AWS_STORAGE_BUCKET_NAME (общее хранилище R2/S3)."
+                ))
+            requeued, failed = await jobs.recover_stale()
+            if requeued or failed:
+                self.stdout.write(self.style.WARNING(
+                    f"Брошенные задания (воркер упал): возвращено в очередь {requeued}, остановлено {failed}."
+                ))
+            try:
+                while True:
+                    job = await jobs.claim_next()
+                    if job is None:
+                        if self.once:
+                            break
+                        await asyncio.sleep(self.poll_interval)
+                        continue
+                    if not self.browser.is_connected():
+                        self.stdout.write(self.style.WARNING("Браузер отключился, запускаю заново."))
+                        await self.start_browser()
+                    await self.run_job(job)
+            finally:
+                await self.browser.close()
+                await downloads.close()
+                derivatives.shutdown()
+                self.stdout.write("Воркер остановлен.")
+
+    async def start_browser(self):
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        self.pool = await self.open_pool(self.concurrency)
+
+    async def run_job(self, job):
+        params = {**self.defaults, **job.params}
+        selection = selection_params(params)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== Задание #{job.id}: {describe(selection)} ==="))
+        self.full = params.get('full', False)
+        self.set_dates()
+        self.reset_stats()
+        error = ""
+        self.job = job
+        heartbeat = asyncio.ensure_future(self.heartbeat_loop(job))
+        try:
+            establishments = await self.get_establishments(selection)
+            await jobs.start(job, len(establishments))
+            # Запуск привязан к заданию: если воркер упал, задание вернется в очередь
+            # (jobs.recover_stale) и продолжится с контрольной точки
+            self.run = await checkpoints.start_run(params, run_id=f"job-{job.id}")
+            await self.load_checkpoints()
+            if establishments:
+                await self.run_establishments(self.pool, establishments)
+                await checkpoints.finish_run(self.run)
+            else:
+                self.stdout.write(self.style.WARNING('Не найдено заведений для парсинга.'))
+        except Exception:
+            error = traceback.format_exc()
+            self.stdout.write(self.style.ERROR(f"Задание #{job.id} упало:\n{error}"))
+        finally:
+            heartbeat.cancel()
+            await jobs.finish(job, error)
+            self.job = None
+            await self.report_cache()
+        if not error:
+            self.stdout.write(self.style.SUCCESS(
+                f"Задание #{job.id} выполнено за {job.duration_seconds:.0f} с: заведений {job.processed_establishments}"
+                f" (с ошибкой {job.failed_establishments}), новых акций {job.promotions_found}."
+            ))
+
+    async def heartbeat_loop(self, job):
+        """Отмечается в задании, пока оно выполняется, чтобы его не сочли брошенным."""
+        while True:
+            await asyncio.sleep(jobs.HEARTBEAT_SECONDS)
+            try:
+                await jobs.heartbeat(job)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Не удалось отметиться в задании #{job.id}: {e}"))
+
+    async def establishment_done(self, establishment, result):
+        if self.job:
+            await jobs.record_establishment(self.job, establishment, result)
@@ -0,0 +1,72 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from promotions.models import Promotion
+from promotions.parsing import local_model
+
+
+class Command(BaseCommand):
+    help = 'Обучает локальный классификатор акций на решениях модераторов (опубликовано / удалено)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-samples', type=int, default=50,
+                            help='Минимум примеров каждого класса, чтобы сохранить модель')
+        parser.add_argument('--holdout', type=float, default=0.2,
+                            help='Доля примеров для проверки качества (0 = не проверять)')
+
+    def handle(self, *args, **kwargs):
+        # Берем только тексты, которые пришли из парсера
+        rows = list(
+            Promotion.objects.filter(status__in=[Promotion.STATUS_PUBLISHED, Promotion.STATUS_DELETED])
+            .exclude(raw_text="Добавлено вручную администратором")
+            .exclude(raw_text__startswith="Акция из 'Актуального'")
+            .values_list('raw_text', 'status')
+        )
+        texts = [text for text, _ in rows]
+        labels = [status == Promotion.STATUS_PUBLISHED for _, status in rows]
+        positives = sum(labels)
+        negatives = len(labels) - positives
+        self.stdout.write(f"Примеров: {len(rows)} (опубликовано: {positives}, удалено: {negatives}).")
+
+        min_samples = kwargs['min_samples']
+        if positives < min_samples or negatives < min_samples:
+            self.stdout.write(self.style.WARNING(
+                f"Недостаточно данных (нужно хотя бы по {min_samples} примеров каждого класса). Модель не сохранена."
+            ))
+            return
+
+        holdout = kwargs['holdout']
+        if holdout > 0:
+            self.evaluate(texts, labels, holdout)
+
+        model = local_model.train(texts, labels)
+        key = local_model.save_model(model)
+        self.stdout.write(self.style.SUCCESS(
+            f"Модель обучена ({model['vocab_size']} слов) и сохранена в БД (ParserState '{key}')."
+        ))
+
+    def evaluate(self, texts, labels, holdout):
+        """Проверяет модель на отложенной части данных и печатает, сколько текстов ушло бы в ИИ."""
+        indexes = list(range(len(texts)))
+        random.Random(42).shuffle(indexes)
+        split = int(len(indexes) * (1 - holdout))
+        train_idx, test_idx = indexes[:split], indexes[split:]
+        if not test_idx:
+            return
+        model = local_model.train([texts[n] for n in train_idx], [labels[n] for n in train_idx])
+
+        confident = correct = 0
+        for n in test_idx:
+            verdict = local_model.verdict(model, texts[n])
+            if verdict is None:
+                continue
+            confident += 1
+            if verdict == labels[n]:
+                correct += 1
+        accuracy = f"{correct / confident:.1%}" if confident else "—"
+        self.stdout.write(
+            f"Проверка на {len(test_idx)} примерах: уверенных ответов {confident} "
+            f"({confident / len(test_idx):.0%}), точность среди них {accuracy}, "
+            f"в ИИ ушло бы {len(test_idx) - confident}."
+        )
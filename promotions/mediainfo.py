@@ -0,0 +1,144 @@
+"""
+Метаданные медиафайла: MIME-тип, размеры в пикселях и длительность видео.
+
+Читаются только заголовки: у картинок — начало файла (Pillow не декодирует пиксели
+при открытии), у MP4 — атомы moov/mvhd/tkhd, а сами данные (mdat) пропускаются через seek.
+Модуль не зависит от Django, как и promotions.imaging.
+"""
+import struct
+
+try:
+    from PIL import Image
+except ImportError:  # без Pillow размеры картинок не определяются, MIME-тип — по сигнатуре
+    Image = None
+
+# Ориентации EXIF, при которых картинку показывают повернутой на 90° (ширина и высота меняются местами)
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Контейнеры MP4/MOV, внутри которых ищем mvhd и tkhd
+CONTAINER_BOXES = {b'moov', b'trak'}
+
+
+def sniff_mime(head):
+    """MIME-тип по первым байтам файла (None, если формат не распознан)."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'heic', b'heix', b'mif1'):
+            return 'image/heic'
+        if brand == b'qt  ':
+            return 'video/quicktime'
+        return 'video/mp4'
+    return None
+
+
+def probe(fileobj):
+    """
+    Возвращает {'mime_type', 'width', 'height', 'duration'}; чего не удалось узнать — None
+    (mime_type — пустая строка). Файл перематывается в начало.
+    """
+    info = {'mime_type': '', 'width': None, 'height': None, 'duration': None}
+    fileobj.seek(0)
+    mime_type = sniff_mime(fileobj.read(32))
+    fileobj.seek(0)
+    if mime_type is None:
+        return info
+    info['mime_type'] = mime_type
+    try:
+        if mime_type.startswith('video/'):
+            info.update(probe_mp4(fileobj))
+        elif Image is not None:
+            info.update(probe_image(fileobj))
+    except (OSError, ValueError, IndexError, struct.error):
+        # Битый или обрезанный файл: оставляем то, что узнали по сигнатуре
+        pass
+    finally:
+        fileobj.seek(0)
+    return info
+
+
+def probe_image(fileobj):
+    """Размеры картинки так, как ее покажет браузер (с учетом поворота из EXIF)."""
+    with Image.open(fileobj) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+    return {'width': width, 'height': height}
+
+
+def read_exact(fileobj, size):
+    """Читает ровно size байт; у обрезанного файла — ValueError."""
+    data = fileobj.read(size)
+    if len(data) < size:
+        raise ValueError("файл обрезан")
+    return data
+
+
+def iter_boxes(fileobj, start, end):
+    """Атомы MP4 в диапазоне [start, end): (тип, начало содержимого, конец атома)."""
+    offset = start
+    while end is None or offset + 8 <= end:
+        fileobj.seek(offset)
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        content = offset + 8
+        if size == 1:
+            size = struct.unpack('>Q', read_exact(fileobj, 8))[0]
+            content += 8
+        elif size == 0:
+            # Атом до конца файла (обычно mdat в конце)
+            fileobj.seek(0, 2)
+            size = fileobj.tell() - offset
+        if size < content - offset:
+            return
+        yield box_type, content, offset + size
+        offset += size
+
+
+def probe_mp4(fileobj):
+    """
+    Длительность из mvhd и размер кадра из tkhd первой видеодорожки.
+    Если файл обрезан, возвращает то, что успели прочитать до обрыва.
+    """
+    info = {}
+    try:
+        read_boxes(fileobj, info)
+    except (ValueError, IndexError, struct.error):
+        pass
+    return info
+
+
+def read_boxes(fileobj, info):
+    pending = [(0, None)]
+    while pending:
+        start, end = pending.pop()
+        for box_type, content, box_end in iter_boxes(fileobj, start, end):
+            if box_type in CONTAINER_BOXES:
+                pending.append((content, box_end))
+            elif box_type == b'mvhd':
+                fileobj.seek(content)
+                version = read_exact(fileobj, 4)[0]
+                if version == 1:
+                    timescale, duration = struct.unpack('>16xIQ', read_exact(fileobj, 28))
+                else:
+                    timescale, duration = struct.unpack('>8xII', read_exact(fileobj, 16))
+                if timescale:
+                    info['duration'] = round(duration / timescale, 3)
+            elif box_type == b'tkhd' and 'width' not in info:
+                fileobj.seek(content)
+                version = read_exact(fileobj, 4)[0]
+                # После полей времени, id, длительности, слоя, громкости и матрицы — ширина и высота (16.16)
+                fileobj.seek(content + 4 + (32 if version == 1 else 20) + 52)
+                width, height = struct.unpack('>II', read_exact(fileobj, 8))
+                if width and height:
+                    info['width'], info['height'] = width >> 16, height >> 16
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificationCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ (sha256)')),
+                ('kind', models.CharField(choices=[('post', 'Текст поста/сторис'), ('highlight', 'Название "Актуального"')], default='post', max_length=10, verbose_name='Тип')),
+                ('model_name', models.CharField(max_length=100, verbose_name='Модель ИИ')),
+                ('prompt_version', models.PositiveIntegerField(default=1, verbose_name='Версия промпта')),
+                ('is_promotion', models.BooleanField(verbose_name='Это акция')),
+                ('text_preview', models.CharField(blank=True, max_length=200, verbose_name='Начало текста')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Попаданий в кэш')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Ответ ИИ (кэш)',
+                'verbose_name_plural': 'Ответы ИИ (кэш)',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishments', '0001_initial'),
+        ('promotions', '0002_classificationcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('posts', 'Посты'), ('stories', 'Сторис'), ('highlights', 'Актуальное')], max_length=10, verbose_name='Раздел')),
+                ('newest_item_date', models.DateField(verbose_name='Дата самого нового обработанного элемента')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parse_marks', to='establishments.establishment', verbose_name='Заведение')),
+            ],
+            options={
+                'verbose_name': 'Отметка парсинга',
+                'verbose_name_plural': 'Отметки парсинга',
+                'unique_together': {('establishment', 'section')},
+            },
+        ),
+    ]
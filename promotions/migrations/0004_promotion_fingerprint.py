@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0003_parsemark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='source_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Ключ исходного файла'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Отпечаток содержимого'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='source_item_id',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Идентификатор элемента в источнике'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='source_section',
+            field=models.CharField(blank=True, choices=[('posts', 'Посты'), ('stories', 'Сторис'), ('highlights', 'Актуальное'), ('manual', 'Добавлено вручную')], max_length=10, verbose_name='Источник'),
+        ),
+    ]
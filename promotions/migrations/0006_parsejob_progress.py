@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0005_parsejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsejob',
+            name='dedupe_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='Ключ дедупликации'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='failed_establishments',
+            field=models.PositiveIntegerField(default=0, verbose_name='Заведений с ошибкой'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='processed_establishments',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано заведений'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='promotions_found',
+            field=models.PositiveIntegerField(default=0, verbose_name='Найдено акций'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='results',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Результаты по заведениям'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='total_establishments',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего заведений'),
+        ),
+        migrations.AddConstraint(
+            model_name='parsejob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('dedupe_key',), name='unique_pending_parse_job'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishments', '0002_establishment_last_parsed_at'),
+        ('promotions', '0006_parsejob_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_key', models.CharField(max_length=64, verbose_name='Ключ запуска')),
+                ('holder', models.CharField(max_length=100, verbose_name='Процесс')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parse_leases', to='establishments.establishment', verbose_name='Заведение')),
+            ],
+            options={
+                'verbose_name': 'Аренда заведения',
+                'verbose_name_plural': 'Аренды заведений',
+                'unique_together': {('run_key', 'establishment')},
+            },
+        ),
+    ]
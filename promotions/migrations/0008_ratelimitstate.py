@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0007_parselease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255, unique=True, verbose_name='Хост')),
+                ('rate', models.FloatField(verbose_name='Скорость (запросов в секунду)')),
+                ('tokens', models.FloatField(verbose_name='Токенов в ведре')),
+                ('updated_at', models.DateTimeField(verbose_name='Обновлено')),
+                ('throttled', models.PositiveIntegerField(default=0, verbose_name='Сколько раз хост нас притормозил')),
+            ],
+            options={
+                'verbose_name': 'Ограничение запросов',
+                'verbose_name_plural': 'Ограничения запросов',
+            },
+        ),
+    ]
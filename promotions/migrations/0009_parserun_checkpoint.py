@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishments', '0002_establishment_last_parsed_at'),
+        ('promotions', '0008_ratelimitstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.CharField(max_length=32, unique=True, verbose_name='ID запуска')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+            ],
+            options={
+                'verbose_name': 'Запуск парсера',
+                'verbose_name_plural': 'Запуски парсера',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ParseCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sections_done', models.JSONField(blank=True, default=dict, verbose_name='Обработанные разделы')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Заведение обработано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parse_checkpoints', to='establishments.establishment', verbose_name='Заведение')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='promotions.parserun', verbose_name='Запуск')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка',
+                'verbose_name_plural': 'Контрольные точки',
+                'unique_together': {('run', 'establishment')},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:30
+
+import re
+
+from django.db import migrations, models
+
+
+def copy_cached_titles(apps, schema_editor):
+    """Переносит уже известные ответы ИИ по названиям 'Актуального' из кэша в таблицу."""
+    ClassificationCache = apps.get_model('promotions', 'ClassificationCache')
+    HighlightTitleVerdict = apps.get_model('promotions', 'HighlightTitleVerdict')
+    seen = set()
+    for entry in ClassificationCache.objects.filter(kind='highlight').order_by('-last_used_at'):
+        title = " ".join(re.sub(r"[^\w\s]", " ", entry.text_preview).replace("_", " ").lower().split())[:200]
+        if not title or title in seen:
+            continue
+        seen.add(title)
+        HighlightTitleVerdict.objects.create(
+            title=title, example=entry.text_preview, is_promotion=entry.is_promotion, hits=entry.hits
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0009_parserun_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighlightTitleVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, unique=True, verbose_name='Название (нормализованное)')),
+                ('example', models.CharField(blank=True, max_length=200, verbose_name='Пример названия')),
+                ('is_promotion', models.BooleanField(verbose_name='Может содержать акции')),
+                ('source', models.CharField(choices=[('ai', 'ИИ'), ('manual', 'Администратор')], default='ai', max_length=10, verbose_name='Кто решил')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Сколько раз использовано')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': "Решение по названию 'Актуального'",
+                'verbose_name_plural': "Решения по названиям 'Актуального'",
+                'ordering': ['-hits'],
+            },
+        ),
+        migrations.RunPython(copy_cached_titles, migrations.RunPython.noop),
+    ]
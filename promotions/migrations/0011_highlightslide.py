@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishments', '0002_establishment_last_parsed_at'),
+        ('promotions', '0010_highlighttitleverdict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighlightSlide',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name="Название 'Актуального' (нормализованное)")),
+                ('slide_key', models.CharField(max_length=255, verbose_name='Ключ слайда')),
+                ('seen_at', models.DateTimeField(auto_now_add=True, verbose_name='Впервые скачан')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='highlight_slides', to='establishments.establishment', verbose_name='Заведение')),
+                ('promotion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='highlight_slides', to='promotions.promotion', verbose_name='Акция')),
+            ],
+            options={
+                'verbose_name': "Слайд 'Актуального'",
+                'verbose_name_plural': "Слайды 'Актуального'",
+                'unique_together': {('establishment', 'title', 'slide_key')},
+            },
+        ),
+    ]
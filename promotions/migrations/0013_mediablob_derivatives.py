@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0012_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='medium_path',
+            field=models.CharField(blank=True, max_length=500, verbose_name='Средний размер'),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='thumbnail_path',
+            field=models.CharField(blank=True, max_length=500, verbose_name='Миниатюра'),
+        ),
+    ]
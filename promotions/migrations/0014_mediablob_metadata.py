@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0013_mediablob_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='duration',
+            field=models.FloatField(blank=True, null=True, verbose_name='Длительность (с)'),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Высота (px)'),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='mime_type',
+            field=models.CharField(blank=True, max_length=100, verbose_name='MIME-тип'),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Ширина (px)'),
+        ),
+    ]
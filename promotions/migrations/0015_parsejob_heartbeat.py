@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0014_mediablob_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsejob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал воркера'),
+        ),
+    ]
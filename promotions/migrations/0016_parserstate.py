@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:01
+
+import json
+
+from django.db import migrations, models
+
+OLD_SESSION_PATH = 'parser/storiesig_session.json'
+
+
+def move_session_file(apps, schema_editor):
+    """Переносит сессию StoriesIG из публично раздаваемого хранилища медиа в БД и удаляет файл."""
+    from django.core.files.storage import default_storage
+
+    ParserState = apps.get_model('promotions', 'ParserState')
+    try:
+        if not default_storage.exists(OLD_SESSION_PATH):
+            return
+        with default_storage.open(OLD_SESSION_PATH, 'rb') as f:
+            state = json.loads(f.read().decode('utf-8'))
+        ParserState.objects.update_or_create(key='storiesig_session', defaults={'value': state})
+        default_storage.delete(OLD_SESSION_PATH)
+    except Exception:
+        # Сессию не жалко: парсер соберет новую при первом поиске
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0015_parsejob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParserState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Ключ')),
+                ('value', models.JSONField(blank=True, default=dict, verbose_name='Значение')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Состояние парсера',
+                'verbose_name_plural': 'Состояния парсера',
+            },
+        ),
+        migrations.RunPython(move_session_file, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:05
+
+import json
+
+from django.db import migrations
+
+OLD_MODEL_PATH = 'parser_models/promo_classifier.json'
+
+
+def move_model_file(apps, schema_editor):
+    """Переносит обученную локальную модель из публично раздаваемого хранилища медиа в БД и удаляет файл."""
+    from django.core.files.storage import default_storage
+
+    ParserState = apps.get_model('promotions', 'ParserState')
+    try:
+        if not default_storage.exists(OLD_MODEL_PATH):
+            return
+        with default_storage.open(OLD_MODEL_PATH, 'rb') as f:
+            model = json.loads(f.read().decode('utf-8'))
+        ParserState.objects.update_or_create(key='promo_classifier', defaults={'value': model})
+        default_storage.delete(OLD_MODEL_PATH)
+    except Exception:
+        # Модель можно обучить заново: manage.py train_promo_classifier
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0016_parserstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_model_file, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+def delete_highlight_entries(apps, schema_editor):
+    """Ответы по названиям 'Актуального' уже перенесены в HighlightTitleVerdict (0010) и больше не читаются."""
+    ClassificationCache = apps.get_model('promotions', 'ClassificationCache')
+    ClassificationCache.objects.filter(kind='highlight').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0017_move_local_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_highlight_entries, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='classificationcache',
+            name='kind',
+            field=models.CharField(choices=[('post', 'Текст поста/сторис')], default='post', max_length=10, verbose_name='Тип'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from establishments.models import Establishment
 
 class Promotion(models.Model):
@@ -12,6 +13,18 @@ class Promotion(models.Model):
         (STATUS_DELETED, 'Удалено'),
     ]
 
+    SOURCE_POSTS = 'posts'
+    SOURCE_STORIES = 'stories'
+    SOURCE_HIGHLIGHTS = 'highlights'
+    SOURCE_MANUAL = 'manual'
+
+    SOURCE_CHOICES = [
+        (SOURCE_POSTS, 'Посты'),
+        (SOURCE_STORIES, 'Сторис'),
+        (SOURCE_HIGHLIGHTS, 'Актуальное'),
+        (SOURCE_MANUAL, 'Добавлено вручную'),
+    ]
+
     establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE, related_name="promotions", verbose_name="Заведение")
     
     raw_text = models.TextField(verbose_name="Сырой текст из Instagram")
@@ -19,6 +32,11 @@ class Promotion(models.Model):
     conditions = models.TextField(blank=True, null=True, verbose_name="Условия и дни проведения")
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_MODERATION, verbose_name="Статус")
+
+    # Откуда пришла акция и ее "отпечаток": по нему парсер узнает уже сохраненные посты
+    source_section = models.CharField(max_length=10, choices=SOURCE_CHOICES, blank=True, verbose_name="Источник")
+    source_item_id = models.CharField(max_length=255, blank=True, verbose_name="Идентификатор элемента в источнике")
+    fingerprint = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Отпечаток содержимого")
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     published_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата публикации")
@@ -30,15 +48,307 @@ class Promotion(models.Model):
         verbose_name = "Акция"
         verbose_name_plural = "Акции"
 
+class MediaBlob(models.Model):
+    """
+    Файл в хранилище, адресуемый по содержимому (sha256). Одинаковые картинки из постов,
+    сторис и "Актуального" хранятся один раз; Media ссылаются на общий файл,
+    а ref_count считает ссылки — когда их не остается, файл удаляется.
+    """
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="Хэш содержимого (sha256)")
+    file_path = models.CharField(max_length=500, verbose_name="Путь к файлу")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер (байт)")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Ссылок")
+    # Метаданные из заголовков файла (см. promotions.mediainfo); None — не удалось определить
+    mime_type = models.CharField(max_length=100, blank=True, verbose_name="MIME-тип")
+    width = models.PositiveIntegerField(null=True, blank=True, verbose_name="Ширина (px)")
+    height = models.PositiveIntegerField(null=True, blank=True, verbose_name="Высота (px)")
+    duration = models.FloatField(null=True, blank=True, verbose_name="Длительность (с)")
+    # Уменьшенные копии для карточек и просмотра (только для картинок, см. promotions.derivatives)
+    thumbnail_path = models.CharField(max_length=500, blank=True, verbose_name="Миниатюра")
+    medium_path = models.CharField(max_length=500, blank=True, verbose_name="Средний размер")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    def __str__(self):
+        return f"{self.file_path} ({self.ref_count} ссылок)"
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+
+
 class Media(models.Model):
     promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name="media", verbose_name="Акция")
     file_path = models.CharField(max_length=500, verbose_name="Путь к файлу")
+    # Общий файл в хранилище; file_path совпадает с blob.file_path (у старых записей blob может не быть)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="media", verbose_name="Файл хранилища")
     
     file_type = models.CharField(max_length=10, choices=[('image', 'Изображение'), ('video', 'Видео')], verbose_name="Тип файла")
+    # Имя исходного файла на CDN: по нему не скачиваем один и тот же файл повторно
+    source_key = models.CharField(max_length=255, blank=True, db_index=True, verbose_name="Ключ исходного файла")
 
     def __str__(self):
         return f"Медиафайл для акции #{self.promotion.id}"
 
     class Meta:
         verbose_name = "Медиафайл"
-        verbose_name_plural = "Медиафайлы"
\ No newline at end of file
+        verbose_name_plural = "Медиафайлы"
+
+class ClassificationCache(models.Model):
+    """
+    Кэш ответов ИИ. Ключ — хэш нормализованного текста + версия промпта + модель,
+    чтобы одни и те же посты не отправлялись в OpenRouter при каждом запуске.
+    """
+    KIND_POST = 'post'
+
+    # Названия "Актуального" решаются через HighlightTitleVerdict, а не через этот кэш
+    KIND_CHOICES = [
+        (KIND_POST, 'Текст поста/сторис'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Ключ (sha256)")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_POST, verbose_name="Тип")
+    model_name = models.CharField(max_length=100, verbose_name="Модель ИИ")
+    prompt_version = models.PositiveIntegerField(default=1, verbose_name="Версия промпта")
+    is_promotion = models.BooleanField(verbose_name="Это акция")
+    text_preview = models.CharField(max_length=200, blank=True, verbose_name="Начало текста")
+
+    hits = models.PositiveIntegerField(default=0, verbose_name="Попаданий в кэш")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Последнее использование")
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.text_preview[:50]} -> {'да' if self.is_promotion else 'нет'}"
+
+    class Meta:
+        verbose_name = "Ответ ИИ (кэш)"
+        verbose_name_plural = "Ответы ИИ (кэш)"
+
+
+class ParseMark(models.Model):
+    """
+    "Отметка уровня" парсера: дата самого нового элемента, который уже обработан
+    в разделе профиля. Следующий запуск не скроллит и не разбирает ничего старше нее.
+    """
+    SECTION_POSTS = 'posts'
+    SECTION_STORIES = 'stories'
+    SECTION_HIGHLIGHTS = 'highlights'
+
+    SECTION_CHOICES = [
+        (SECTION_POSTS, 'Посты'),
+        (SECTION_STORIES, 'Сторис'),
+        (SECTION_HIGHLIGHTS, 'Актуальное'),
+    ]
+
+    establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE, related_name="parse_marks", verbose_name="Заведение")
+    section = models.CharField(max_length=10, choices=SECTION_CHOICES, verbose_name="Раздел")
+    newest_item_date = models.DateField(verbose_name="Дата самого нового обработанного элемента")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f"{self.establishment.name} / {self.get_section_display()}: {self.newest_item_date}"
+
+    class Meta:
+        verbose_name = "Отметка парсинга"
+        verbose_name_plural = "Отметки парсинга"
+        unique_together = [('establishment', 'section')]
+
+
+class ParseJob(models.Model):
+    """Задание на парсинг. Очередь заданий разбирает команда parser_worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, verbose_name="Статус")
+    # Параметры запуска, например {"account_id": 5, "full": true}
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    # Хэш нормализованных параметров: одинаковое задание не ставится в очередь дважды
+    dedupe_key = models.CharField(max_length=64, default='', blank=True, db_index=True, verbose_name="Ключ дедупликации")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+
+    # Прогресс
+    total_establishments = models.PositiveIntegerField(default=0, verbose_name="Всего заведений")
+    processed_establishments = models.PositiveIntegerField(default=0, verbose_name="Обработано заведений")
+    failed_establishments = models.PositiveIntegerField(default=0, verbose_name="Заведений с ошибкой")
+    promotions_found = models.PositiveIntegerField(default=0, verbose_name="Найдено акций")
+    # По каждому заведению: {id: {"username", "seconds", "posts", "stories", "highlights", "error"}}
+    results = models.JSONField(default=dict, blank=True, verbose_name="Результаты по заведениям")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+    # Воркер периодически обновляет heartbeat_at; задание, у которого он давно не обновлялся,
+    # считается брошенным (воркер упал) и возвращается в очередь (см. jobs.recover_stale)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний сигнал воркера")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+
+    def __str__(self):
+        return f"Парсинг #{self.id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Задание на парсинг"
+        verbose_name_plural = "Задания на парсинг"
+        ordering = ['-created_at']
+        constraints = [
+            # В очереди может ждать только одно задание с такими параметрами
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status='pending'), name='unique_pending_parse_job'
+            ),
+        ]
+
+    @property
+    def duration_seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+
+class ParseLease(models.Model):
+    """
+    "Аренда" заведения в рамках одного запуска: несколько процессов (или машин),
+    запущенных с одним ключом запуска, делят список заведений без пересечений.
+    """
+    run_key = models.CharField(max_length=64, verbose_name="Ключ запуска")
+    establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE, related_name="parse_leases", verbose_name="Заведение")
+    holder = models.CharField(max_length=100, verbose_name="Процесс")
+    expires_at = models.DateTimeField(verbose_name="Истекает")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Обработано")
+
+    def __str__(self):
+        return f"{self.run_key}: {self.establishment} ({self.holder})"
+
+    class Meta:
+        verbose_name = "Аренда заведения"
+        verbose_name_plural = "Аренды заведений"
+        unique_together = ('run_key', 'establishment')
+
+
+class RateLimitState(models.Model):
+    """
+    Общее для всех процессов парсера состояние ограничителя запросов к одному хосту
+    (ведро токенов, скорость которого подстраивается по ответам хоста).
+    """
+    host = models.CharField(max_length=255, unique=True, verbose_name="Хост")
+    rate = models.FloatField(verbose_name="Скорость (запросов в секунду)")
+    tokens = models.FloatField(verbose_name="Токенов в ведре")
+    updated_at = models.DateTimeField(verbose_name="Обновлено")
+    throttled = models.PositiveIntegerField(default=0, verbose_name="Сколько раз хост нас притормозил")
+
+    def __str__(self):
+        return f"{self.host}: {self.rate:.2f} запросов/с"
+
+    class Meta:
+        verbose_name = "Ограничение запросов"
+        verbose_name_plural = "Ограничения запросов"
+
+
+class ParseRun(models.Model):
+    """Один запуск парсера. По его контрольным точкам прерванный запуск можно продолжить (--resume)."""
+    run_id = models.CharField(max_length=32, unique=True, verbose_name="ID запуска")
+    # Выборка и опции запуска: {"selection": {...}, "full": false, "shard": [0, 2]}
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="Начало")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+
+    def __str__(self):
+        return f"Запуск {self.run_id}"
+
+    class Meta:
+        verbose_name = "Запуск парсера"
+        verbose_name_plural = "Запуски парсера"
+        ordering = ['-started_at']
+
+
+class ParseCheckpoint(models.Model):
+    """Контрольная точка: докуда запуск дошел по одному заведению."""
+    run = models.ForeignKey(ParseRun, on_delete=models.CASCADE, related_name="checkpoints", verbose_name="Запуск")
+    establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE, related_name="parse_checkpoints", verbose_name="Заведение")
+    # Разделы, которые уже полностью обработаны, и сколько в каждом найдено акций: {"posts": 2, "stories": 0}
+    sections_done = models.JSONField(default=dict, blank=True, verbose_name="Обработанные разделы")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Заведение обработано")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    def __str__(self):
+        return f"{self.run}: {self.establishment}"
+
+    class Meta:
+        verbose_name = "Контрольная точка"
+        verbose_name_plural = "Контрольные точки"
+        unique_together = ('run', 'establishment')
+
+
+class HighlightTitleVerdict(models.Model):
+    """
+    Общая для всех заведений таблица решений по названиям "Актуального"
+    ("Акции", "Sale", "Меню"...). Сначала парсер смотрит сюда и только для
+    новых названий спрашивает ИИ. Решение администратора ИИ не перезаписывает.
+    """
+    SOURCE_AI = 'ai'
+    SOURCE_MANUAL = 'manual'
+
+    SOURCE_CHOICES = [
+        (SOURCE_AI, 'ИИ'),
+        (SOURCE_MANUAL, 'Администратор'),
+    ]
+
+    title = models.CharField(max_length=200, unique=True, verbose_name="Название (нормализованное)")
+    example = models.CharField(max_length=200, blank=True, verbose_name="Пример названия")
+    is_promotion = models.BooleanField(verbose_name="Может содержать акции")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_AI, verbose_name="Кто решил")
+    hits = models.PositiveIntegerField(default=0, verbose_name="Сколько раз использовано")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    def __str__(self):
+        return f"{self.title} -> {'да' if self.is_promotion else 'нет'} ({self.get_source_display()})"
+
+    class Meta:
+        verbose_name = "Решение по названию 'Актуального'"
+        verbose_name_plural = "Решения по названиям 'Актуального'"
+        ordering = ['-hits']
+
+
+class HighlightSlide(models.Model):
+    """
+    Слайд "Актуального", который парсер уже скачал. Хайлайты живут долго:
+    при следующих запусках известные слайды пропускаются, а новые
+    добавляются к той же акции.
+    """
+    establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE, related_name="highlight_slides", verbose_name="Заведение")
+    title = models.CharField(max_length=200, verbose_name="Название 'Актуального' (нормализованное)")
+    slide_key = models.CharField(max_length=255, verbose_name="Ключ слайда")
+    promotion = models.ForeignKey(Promotion, on_delete=models.SET_NULL, null=True, blank=True, related_name="highlight_slides", verbose_name="Акция")
+    seen_at = models.DateTimeField(auto_now_add=True, verbose_name="Впервые скачан")
+
+    def __str__(self):
+        return f"{self.establishment} / {self.title}: {self.slide_key}"
+
+    class Meta:
+        verbose_name = "Слайд 'Актуального'"
+        verbose_name_plural = "Слайды 'Актуального'"
+        unique_together = ('establishment', 'title', 'slide_key')
+
+
+class ParserState(models.Model):
+    """
+    Общее для всех процессов парсера служебное состояние (куки сессии StoriesIG и т. п.).
+    Хранится в БД, а не в хранилище медиа: файлы оттуда раздаются публично.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name="Ключ")
+    value = models.JSONField(default=dict, blank=True, verbose_name="Значение")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = "Состояние парсера"
+        verbose_name_plural = "Состояния парсера"
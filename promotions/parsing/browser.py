@@ -0,0 +1,88 @@
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+# Типы ресурсов, которые парсеру не нужны: нам нужен только DOM и ссылки на скачивание
+BLOCKED_RESOURCE_TYPES = set(getattr(settings, 'PARSER_BLOCKED_RESOURCE_TYPES', ['image', 'media', 'font']))
+
+# Реклама и аналитика (блокируются независимо от типа ресурса)
+BLOCKED_HOSTS = [
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'googletagservices.com', 'adservice.google.com', 'mc.yandex.ru',
+    'an.yandex.ru', 'yandex.ru/ads', 'connect.facebook.net', 'hotjar.com', 'clarity.ms',
+    'adnxs.com', 'criteo.com', 'taboola.com', 'outbrain.com', 'popads.net', 'propellerads.com',
+    'onclickads.net', 'adsterra.com', 'cloudflareinsights.com',
+    *getattr(settings, 'PARSER_BLOCKED_HOSTS', []),
+]
+
+# То, что нельзя блокировать никогда (подстроки URL), — если сайт перестанет грузить список без чего-то
+ALLOWLIST = list(getattr(settings, 'PARSER_BLOCK_ALLOWLIST', []))
+
+
+class ResourceBlocker:
+    """
+    Фильтр запросов для контекста браузера: обрывает картинки, видео, шрифты и
+    рекламу/аналитику. Считает, сколько запросов заблокировано и сколько байт
+    загружено пропущенными запросами — отдельно для каждого профиля (см. reset()).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocked = {}
+        self.allowed_requests = 0
+        self.loaded_bytes = 0
+
+    async def install(self, context):
+        await context.route("**/*", self._handle)
+        context.on("response", self._on_response)
+
+    def _should_block(self, request):
+        url = request.url
+        if any(pattern in url for pattern in ALLOWLIST):
+            return None
+        if request.resource_type in BLOCKED_RESOURCE_TYPES:
+            return request.resource_type
+        host = urlparse(url).hostname or ""
+        host_and_path = host + urlparse(url).path
+        if any(host == blocked or host.endswith('.' + blocked) or host_and_path.startswith(blocked) for blocked in BLOCKED_HOSTS):
+            return 'ads'
+        return None
+
+    async def _handle(self, route):
+        reason = self._should_block(route.request)
+        if reason:
+            self.blocked[reason] = self.blocked.get(reason, 0) + 1
+            await route.abort()
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+    def _on_response(self, response):
+        try:
+            self.loaded_bytes += int(response.headers.get('content-length', 0))
+        except ValueError:
+            pass
+
+    def summary(self):
+        total = sum(self.blocked.values())
+        details = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.blocked.items())) or "—"
+        return (f"Заблокировано запросов: {total} ({details}); "
+                f"пропущено: {self.allowed_requests}, загружено {self.loaded_bytes / 1024:.0f} КБ.")
+
+
+def memory_used_mb():
+    """
+    Сколько памяти занято на машине (МБ), по /proc/meminfo.
+    Chromium живет в отдельных процессах, поэтому смотрим на всю машину, а не на свой процесс.
+    Возвращает None, если /proc/meminfo недоступен (не Linux).
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            values = {line.split(':')[0]: int(line.split()[1]) for line in f if ':' in line}
+    except (OSError, ValueError, IndexError):
+        return None
+    if 'MemTotal' not in values or 'MemAvailable' not in values:
+        return None
+    return (values['MemTotal'] - values['MemAvailable']) // 1024
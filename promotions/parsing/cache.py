@@ -0,0 +1,90 @@
+import hashlib
+import re
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from promotions.models import ClassificationCache
+
+# Сколько дней ответ ИИ считается актуальным
+CACHE_TTL_DAYS = getattr(settings, 'PARSER_AI_CACHE_TTL_DAYS', 90)
+# Максимальный размер кэша; лишние записи удаляются по давности использования (LRU)
+CACHE_MAX_ENTRIES = getattr(settings, 'PARSER_AI_CACHE_MAX_ENTRIES', 50000)
+
+# Счетчики попаданий/промахов за текущий запуск
+stats = {'hits': 0, 'misses': 0}
+
+
+def normalize_text(text):
+    """Нижний регистр и схлопнутые пробелы: мелкие отличия в верстке не ломают кэш."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def make_key(kind, text, model_name, prompt_version):
+    raw = f"{kind}\x00{model_name}\x00{prompt_version}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _ttl_cutoff():
+    return timezone.now() - timedelta(days=CACHE_TTL_DAYS)
+
+
+def get_verdicts_sync(keys):
+    """Возвращает {key: is_promotion} для найденных и не устаревших записей."""
+    if not keys:
+        return {}
+    found = dict(
+        ClassificationCache.objects
+        .filter(key__in=set(keys), created_at__gte=_ttl_cutoff())
+        .values_list('key', 'is_promotion')
+    )
+    if found:
+        ClassificationCache.objects.filter(key__in=found.keys()).update(
+            hits=F('hits') + 1, last_used_at=timezone.now()
+        )
+    stats['hits'] += sum(1 for key in keys if key in found)
+    stats['misses'] += sum(1 for key in keys if key not in found)
+    return found
+
+
+def store_verdicts_sync(entries, kind, model_name, prompt_version):
+    """
+    Сохраняет ответы ИИ. entries — список (key, text, is_promotion);
+    ответы None (ошибка API) не кэшируются.
+    """
+    now = timezone.now()
+    for key, text, is_promotion in entries:
+        if is_promotion is None:
+            continue
+        ClassificationCache.objects.update_or_create(
+            key=key,
+            defaults={
+                'kind': kind,
+                'model_name': model_name,
+                'prompt_version': prompt_version,
+                'is_promotion': is_promotion,
+                'text_preview': (text or "")[:200],
+                'created_at': now,
+                'last_used_at': now,
+            },
+        )
+
+
+def evict_sync():
+    """Удаляет устаревшие записи (TTL) и самые давно использованные сверх лимита (LRU)."""
+    deleted, _ = ClassificationCache.objects.filter(created_at__lt=_ttl_cutoff()).delete()
+    overflow = ClassificationCache.objects.count() - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = list(
+            ClassificationCache.objects.order_by('last_used_at').values_list('id', flat=True)[:overflow]
+        )
+        deleted += ClassificationCache.objects.filter(id__in=stale_ids).delete()[0]
+    return deleted
+
+
+get_verdicts = sync_to_async(get_verdicts_sync, thread_sensitive=True)
+store_verdicts = sync_to_async(store_verdicts_sync, thread_sensitive=True)
+evict = sync_to_async(evict_sync, thread_sensitive=True)
@@ -0,0 +1,55 @@
+"""
+Контрольные точки запуска: какие заведения готовы и какие разделы у остальных
+уже обработаны. Запуск, прерванный на середине (упал процесс, Fly остановил машину),
+продолжается с того же места: manage.py parse_instagram --resume <run_id>.
+Повторно обработанные внутри раздела посты не дублируются — их узнают по отпечаткам.
+"""
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from promotions.models import ParseCheckpoint, ParseRun
+
+
+def start_run_sync(params, run_id=None):
+    """Создает запуск (или возвращает уже существующий с таким run_id)."""
+    run, _ = ParseRun.objects.get_or_create(run_id=run_id or uuid.uuid4().hex[:12], defaults={'params': params})
+    return run
+
+
+def load_run_sync(run_id):
+    return ParseRun.objects.filter(run_id=run_id).first()
+
+
+def load_checkpoints_sync(run):
+    """{id заведения: (завершено ли, {раздел: найдено акций})} — одним запросом."""
+    return {
+        establishment_id: (completed_at is not None, sections_done)
+        for establishment_id, completed_at, sections_done in
+        run.checkpoints.values_list('establishment_id', 'completed_at', 'sections_done')
+    }
+
+
+def save_section_sync(run, establishment, section, found):
+    checkpoint, _ = ParseCheckpoint.objects.get_or_create(run=run, establishment=establishment)
+    checkpoint.sections_done[section] = found
+    checkpoint.save(update_fields=['sections_done', 'updated_at'])
+
+
+def complete_establishment_sync(run, establishment):
+    ParseCheckpoint.objects.update_or_create(
+        run=run, establishment=establishment, defaults={'completed_at': timezone.now()}
+    )
+
+
+def finish_run_sync(run):
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at'])
+
+
+start_run = sync_to_async(start_run_sync, thread_sensitive=True)
+load_checkpoints = sync_to_async(load_checkpoints_sync, thread_sensitive=True)
+save_section = sync_to_async(save_section_sync, thread_sensitive=True)
+complete_establishment = sync_to_async(complete_establishment_sync, thread_sensitive=True)
+finish_run = sync_to_async(finish_run_sync, thread_sensitive=True)
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from openai import AsyncOpenAI, APIConnectionError, APIError, APIStatusError
+
+from promotions.models import ClassificationCache
+from promotions.parsing import cache, highlight_titles, local_model, ratelimit
+from promotions.parsing.output import log
+
+OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
+AI_MODEL_NAME = "mistralai/mistral-nemo"
+AI_HOST = "openrouter.ai"
+# Повторы делает ratelimit (общий лимит на все процессы), поэтому у клиента они выключены
+ai_client = AsyncOpenAI(base_url=f"https://{AI_HOST}/api/v1", api_key=OPENROUTER_API_KEY, max_retries=0)
+
+# Версия промпта входит в ключ кэша: поменяли формулировку — увеличьте версию
+POST_PROMPT_VERSION = 1
+
+# Сколько запросов к ИИ может идти одновременно (общий лимит на все профили)
+AI_CONCURRENCY = 5
+# Сколько текстов отправлять в одном запросе (1 = по одному тексту на запрос)
+AI_BATCH_SIZE = 1
+
+_semaphore = None
+# Локальная модель (promotions/parsing/local_model.py); None — все решает ИИ
+_local_model = None
+
+# Сколько текстов решила локальная модель и сколько ушло в ИИ за текущий запуск
+stats = {'local': 0, 'ai': 0}
+
+
+def configure(concurrency=None, batch_size=None):
+    """Настраивает стадию классификации (вызывается командой парсинга)."""
+    global AI_CONCURRENCY, AI_BATCH_SIZE, _semaphore
+    if concurrency:
+        AI_CONCURRENCY = max(1, concurrency)
+        _semaphore = None
+    if batch_size:
+        AI_BATCH_SIZE = max(1, batch_size)
+
+
+async def load_local_model():
+    """Загружает локальную модель из БД, если ее уже обучили."""
+    global _local_model
+    _local_model = await sync_to_async(local_model.load_model, thread_sensitive=True)()
+    return _local_model
+
+
+def get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(AI_CONCURRENCY)
+    return _semaphore
+
+
+def build_post_prompt(post_text):
+    # ОБНОВЛЕННЫЙ ПРОМПТ С НОВЫМИ КЛЮЧЕВЫМИ СЛОВАМИ
+    return (f"Текст из Instagram: {post_text}\n\n"
+            f"Вопрос:Этот текст описывает акцию, скидку, распродажу, **ликвидацию**, **черную пятницу** (black friday) или спецпредложение?"
+            f"Ответь только 'да' или 'нет'.")
+
+
+def build_batch_prompt(post_texts):
+    numbered = "\n\n".join(f"[{n}] {text}" for n, text in enumerate(post_texts, start=1))
+    return (f"Ниже {len(post_texts)} пронумерованных текстов из Instagram.\n\n{numbered}\n\n"
+            f"Вопрос: для КАЖДОГО текста ответь, описывает ли он акцию, скидку, распродажу, ликвидацию, "
+            f"черную пятницу (black friday) или спецпредложение.\n"
+            f"Ответь только JSON-объектом без пояснений, где ключ — номер текста, а значение — 'да' или 'нет'. "
+            f"Например: {{\"1\": \"да\", \"2\": \"нет\"}}")
+
+
+def build_highlight_prompt(highlight_title):
+    return (f"Название 'Актуального' (Highlights) в Instagram: {highlight_title}\n\n"
+            f"Вопрос: Судя по этому названию (например, 'Акции', 'Sale', 'Скидки', 'Offers'), в этом разделе могут содержаться акции, скидки, распродажи, ликвидации или спецпредложения? "
+            f"Ответь только 'да' или 'нет'.")
+
+
+async def ask_ai(prompt, max_tokens=50):
+    """Один запрос к OpenRouter. Возвращает ответ модели в нижнем регистре."""
+    async def request():
+        try:
+            return await ai_client.chat.completions.create(
+                model=AI_MODEL_NAME, messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0.1
+            )
+        except APIStatusError as e:
+            if e.status_code in ratelimit.RETRYABLE_STATUSES:
+                retry_after = ratelimit.parse_retry_after(e.response.headers.get('retry-after'))
+                raise ratelimit.RetryableError(e.status_code, retry_after) from e
+            raise
+
+    # Сначала место в семафоре, потом токен лимита: иначе задачи, ждущие семафора,
+    # тратили бы токены впустую. Лимит и повторы при 429/5xx — общие для всех процессов (см. ratelimit)
+    async with get_semaphore():
+        completion = await ratelimit.call(AI_HOST, request, retry_on=(APIConnectionError,))
+    return completion.choices[0].message.content.strip().lower() if completion.choices else ""
+
+
+def parse_batch_answer(ai_response, size):
+    """
+    Разбирает JSON-ответ пакетного запроса.
+    Возвращает список вердиктов (True/False/None) длиной size;
+    None — модель не дала ответа по этому тексту.
+    """
+    verdicts = [None] * size
+    match = re.search(r"\{.*\}", ai_response, re.DOTALL)
+    if not match:
+        return verdicts
+    try:
+        answers = json.loads(match.group(0))
+    except ValueError:
+        return verdicts
+    for key, value in answers.items():
+        try:
+            index = int(str(key).strip("[] ")) - 1
+        except ValueError:
+            continue
+        if 0 <= index < size:
+            value = str(value).lower()
+            if 'да' in value: verdicts[index] = True
+            elif 'нет' in value: verdicts[index] = False
+    return verdicts
+
+
+async def classify_post(post_text):
+    """
+    Классифицирует один текст.
+    Возвращает True/False, или None если ИИ не ответил (ошибка API).
+    """
+    try:
+        ai_response = await ask_ai(build_post_prompt(post_text))
+        log(f"    > Ответ ИИ на '{post_text[:40].strip()}...': '{ai_response}'")
+        return 'да' in ai_response
+    except (APIError, ratelimit.RetryableError) as e:
+        log(f"    ! Ошибка API OpenRouter: {e}. Пропускаю пост.")
+    except Exception as e:
+        log(f"    ! Общая ошибка при вызове ИИ: {e}. Пропускаю пост.")
+    return None
+
+
+async def classify_batch(post_texts):
+    """Классифицирует несколько текстов одним запросом; нераспознанные добирает по одному."""
+    verdicts = [None] * len(post_texts)
+    try:
+        ai_response = await ask_ai(build_batch_prompt(post_texts), max_tokens=20 + 10 * len(post_texts))
+        verdicts = parse_batch_answer(ai_response, len(post_texts))
+        log(f"    > Пакетный ответ ИИ ({len(post_texts)} текстов): '{ai_response[:120]}'")
+    except (APIError, ratelimit.RetryableError) as e:
+        log(f"    ! Ошибка API OpenRouter в пакетном запросе: {e}. Классифицирую по одному.")
+    except Exception as e:
+        log(f"    ! Общая ошибка в пакетном запросе: {e}. Классифицирую по одному.")
+
+    missing = [n for n, verdict in enumerate(verdicts) if verdict is None]
+    if missing:
+        retried = await asyncio.gather(*(classify_post(post_texts[n]) for n in missing))
+        for n, verdict in zip(missing, retried):
+            verdicts[n] = verdict
+    return verdicts
+
+
+async def classify_uncached(post_texts):
+    """Отправляет тексты в ИИ: параллельно по одному или пакетами (AI_BATCH_SIZE > 1)."""
+    if AI_BATCH_SIZE <= 1:
+        return list(await asyncio.gather(*(classify_post(text) for text in post_texts)))
+
+    batches = [post_texts[n:n + AI_BATCH_SIZE] for n in range(0, len(post_texts), AI_BATCH_SIZE)]
+    results = await asyncio.gather(*(classify_batch(batch) for batch in batches))
+    return [verdict for batch_verdicts in results for verdict in batch_verdicts]
+
+
+async def classify_posts(post_texts):
+    """
+    Классифицирует все тексты профиля параллельно (под общим семафором).
+    Сначала смотрит в кэш, затем в локальную модель; в ИИ уходят только новые
+    и сомнительные тексты (каждый уникальный — один раз).
+    Возвращает список вердиктов в том же порядке, что и post_texts.
+    """
+    if not post_texts:
+        return []
+    keys = [cache.make_key(ClassificationCache.KIND_POST, text, AI_MODEL_NAME, POST_PROMPT_VERSION) for text in post_texts]
+    verdicts_by_key = await cache.get_verdicts(keys)
+    if verdicts_by_key:
+        log(f"    > Из кэша: {sum(1 for key in keys if key in verdicts_by_key)} из {len(keys)} текстов.")
+
+    uncached = {}
+    for key, text in zip(keys, post_texts):
+        if key not in verdicts_by_key:
+            uncached.setdefault(key, text)
+
+    # Уверенные ответы локальной модели не отправляем в ИИ
+    if _local_model and uncached:
+        local_count = 0
+        for key, text in list(uncached.items()):
+            verdict = local_model.verdict(_local_model, text)
+            if verdict is not None:
+                verdicts_by_key[key] = verdict
+                del uncached[key]
+                local_count += 1
+        stats['local'] += local_count
+        if local_count:
+            log(f"    > Локальная модель уверенно решила {local_count} текст(ов).")
+
+    if uncached:
+        stats['ai'] += len(uncached)
+        new_verdicts = await classify_uncached(list(uncached.values()))
+        entries = [(key, text, verdict) for (key, text), verdict in zip(uncached.items(), new_verdicts)]
+        await cache.store_verdicts(entries, ClassificationCache.KIND_POST, AI_MODEL_NAME, POST_PROMPT_VERSION)
+        verdicts_by_key.update({key: verdict for key, _, verdict in entries})
+
+    return [verdicts_by_key.get(key) for key in keys]
+
+
+async def classify_highlight_title(highlight_title):
+    """Смотрит общую таблицу названий, а для новых названий спрашивает ИИ, могут ли в 'Актуальном' быть акции."""
+    verdict = await highlight_titles.get_verdict(highlight_title)
+    if verdict is not None:
+        return verdict
+    try:
+        ai_response = await ask_ai(build_highlight_prompt(highlight_title))
+    except Exception:
+        return False
+    is_promotion = 'да' in ai_response
+    await highlight_titles.store_verdict(highlight_title, is_promotion)
+    return is_promotion
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import tempfile
+from urllib.parse import urlparse
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from promotions import blobs, derivatives, mediainfo
+from promotions.parsing import ratelimit
+from promotions.parsing.output import log
+
+MEDIA_HOST = "https://media.storiesig.info"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Всего одновременных соединений и сколько из них держим открытыми (keep-alive)
+MAX_CONNECTIONS = getattr(settings, 'PARSER_DOWNLOAD_MAX_CONNECTIONS', 20)
+MAX_KEEPALIVE = getattr(settings, 'PARSER_DOWNLOAD_MAX_KEEPALIVE', 10)
+# Сколько одновременных скачиваний с одного хоста
+PER_HOST_LIMIT = getattr(settings, 'PARSER_DOWNLOAD_PER_HOST', 4)
+# Таймауты в секундах: на соединение и на весь файл (видео бывают большими)
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+# Файл пишется кусками во временный файл: до этого размера он живет в памяти,
+# дальше сбрасывается на диск. Так память не растет даже на больших видео.
+SPOOL_MAX_SIZE = getattr(settings, 'PARSER_DOWNLOAD_SPOOL_MAX_SIZE', 2 * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+
+_client = None
+_host_semaphores = {}
+
+# Сколько файлов не пришлось загружать в хранилище (уже были там) и сколько байт это сэкономило
+stats = {'reused': 0, 'saved_bytes': 0}
+
+
+def get_client():
+    """Общий на весь запуск HTTP-клиент с пулом соединений."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+    return _client
+
+
+def host_semaphore(url):
+    host = urlparse(url).netloc
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return _host_semaphores[host]
+
+
+async def close():
+    """Закрывает пул соединений (в конце запуска)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_semaphores.clear()
+
+
+def absolute_url(download_url):
+    if download_url.startswith('/get'):
+        return f"{MEDIA_HOST}{download_url}"
+    return download_url
+
+
+async def fetch_to_file(url):
+    """
+    Скачивает файл потоком во временный файл (SpooledTemporaryFile), по пути считая sha256.
+    Возвращает (файл, перемотанный в начало, sha256, размер). Закрыть файл должен вызывающий.
+    Ошибки HTTP пробрасываются как httpx.HTTPError (или ratelimit.RetryableError,
+    если хост отвечал 429/5xx на все попытки).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    digest = None
+
+    async def attempt():
+        nonlocal digest
+        spool.seek(0)
+        spool.truncate()
+        digest = hashlib.sha256()
+        async with host_semaphore(url):
+            async with get_client().stream('GET', url) as response:
+                if response.status_code in ratelimit.RETRYABLE_STATUSES:
+                    raise ratelimit.RetryableError(
+                        response.status_code, ratelimit.parse_retry_after(response.headers.get('retry-after'))
+                    )
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    spool.write(chunk)
+                    digest.update(chunk)
+
+    try:
+        # Лимит хоста и повторы при 429/5xx и сетевых ошибках
+        await ratelimit.call(ratelimit.host_of(url), attempt, retry_on=(httpx.TransportError,))
+    except BaseException:
+        spool.close()
+        raise
+    size = spool.tell()
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+# Загрузка в хранилище (R2/S3) не трогает БД, поэтому не занимает общий поток для ORM
+upload_blob = sync_to_async(blobs.upload_blob, thread_sensitive=False)
+find_blob = sync_to_async(blobs.find_blob, thread_sensitive=True)
+register_blob = sync_to_async(blobs.register_blob, thread_sensitive=True)
+create_media = sync_to_async(blobs.create_media, thread_sensitive=True)
+
+
+async def save_media(promotion, download_url, is_video, source_key=""):
+    """
+    Скачивает файл, кладет его в хранилище по хэшу содержимого и создает запись Media.
+    Если такой файл уже есть в хранилище (у другой акции), повторно он не загружается.
+    """
+    spool, sha256, size = await fetch_to_file(absolute_url(download_url))
+    image_data = None
+    try:
+        blob = await find_blob(sha256)
+        if blob is None:
+            # Читаются только заголовки (для MP4 — атомы moov), это быстро даже для видео
+            metadata = mediainfo.probe(spool)
+            # Хранилище читает файл кусками (FileSystemStorage — chunks(), S3 — upload_fileobj)
+            path = await upload_blob(spool, sha256, ".mp4" if is_video else ".jpg")
+            blob = await register_blob(sha256, path, size, metadata)
+            if not is_video:
+                spool.seek(0)
+                image_data = spool.read()
+        else:
+            stats['reused'] += 1
+            stats['saved_bytes'] += size
+    finally:
+        spool.close()
+    media = await create_media(promotion, blob, 'video' if is_video else 'image', source_key)
+    if image_data is not None:
+        try:
+            await derivatives.build(blob, image_data)
+        except Exception as e:
+            # Без уменьшенных копий файл все равно доступен; их доделает build_media_derivatives
+            log(f"      ! Не удалось сделать уменьшенные копии для {blob.file_path}: {e}")
+    return media
@@ -0,0 +1,59 @@
+"""
+Извлечение элементов списка (посты, сторис, слайды хайлайтов) одним вызовом page.evaluate.
+
+Раньше на каждый li.profile-media-list__item уходило несколько обращений к браузеру
+(count, get_attribute, inner_text, ...). Теперь весь список читается за один раз
+и дальше код работает с обычными словарями.
+"""
+from datetime import datetime
+
+ITEM_SELECTOR = "li.profile-media-list__item"
+HIGHLIGHT_SELECTOR = "li.highlight.highlights-component__highlight"
+
+_EXTRACT_JS = """
+(selector) => Array.from(document.querySelectorAll(selector)).map((li, index) => {
+    const time = li.querySelector('p.media-content__meta-time');
+    const caption = li.querySelector('p.media-content__caption') || li.querySelector('.media-content__text');
+    const button = li.querySelector('a.button__download');
+    return {
+        index: index,
+        date_title: time ? time.getAttribute('title') : null,
+        caption: caption ? caption.innerText : '',
+        download_url: button ? button.getAttribute('href') : null,
+        is_video: li.querySelector('.tags__item--video') !== null,
+    };
+})
+"""
+
+_HIGHLIGHT_TITLES_JS = """
+(selector) => Array.from(document.querySelectorAll(selector)).map((li) => {
+    const title = li.querySelector('p.highlight__title');
+    return title ? title.innerText.trim() : '';
+})
+"""
+
+
+def parse_date(date_string):
+    if not date_string: return None
+    date_part = date_string.split(',')[0].strip()
+    formats = ['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y']
+    for fmt in formats:
+        try: return datetime.strptime(date_part, fmt)
+        except ValueError: continue
+    return None
+
+
+async def extract_media_items(page, selector=ITEM_SELECTOR):
+    """
+    Возвращает список словарей по всем элементам на странице:
+    index, date_title, date (datetime или None), caption, download_url, is_video.
+    """
+    records = await page.evaluate(_EXTRACT_JS, selector)
+    for record in records:
+        record['date'] = parse_date(record['date_title'])
+    return records
+
+
+async def extract_highlight_titles(page, selector=HIGHLIGHT_SELECTOR):
+    """Названия всех "Актуальных" на странице (по порядку; '' — если названия нет)."""
+    return await page.evaluate(_HIGHLIGHT_TITLES_JS, selector)
@@ -0,0 +1,83 @@
+import hashlib
+from urllib.parse import parse_qs, parse_qsl, unquote, urlencode, urlparse
+
+from asgiref.sync import sync_to_async
+
+from promotions.models import Media, Promotion
+from promotions.parsing.cache import normalize_text
+
+# Параметры ссылок CDN Instagram, которые меняются от запуска к запуску (подписи, срок жизни)
+VOLATILE_PARAMS = {'oh', 'oe', 'efg', 'ccb'}
+
+
+def normalize_url(parsed):
+    """Ссылка без меняющихся параметров и с параметрами в постоянном порядке."""
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name not in VOLATILE_PARAMS and not name.startswith('_nc_')
+    )
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{parsed.path}?{urlencode(params)}"
+
+
+def media_key(download_url):
+    """
+    Стабильное имя медиафайла из ссылки на скачивание.
+    Ссылки storiesig содержат исходный URL инстаграма в параметрах, а подписи
+    в query-строке меняются от запуска к запуску — поэтому берем только имя файла.
+    Если имени файла в ссылке нет (прокси вида /get?token=...), ключ — хэш всей
+    ссылки без меняющихся параметров, иначе все такие файлы получили бы один ключ.
+    """
+    if not download_url:
+        return ""
+    parsed = urlparse(download_url)
+    for values in parse_qs(parsed.query).values():
+        for value in values:
+            inner = urlparse(unquote(value))
+            if inner.scheme in ('http', 'https') and inner.path:
+                parsed = inner
+                break
+    name = parsed.path.rstrip('/').split('/')[-1]
+    if '.' in name:
+        return name[:255]
+    return hashlib.sha256(normalize_url(parsed).encode('utf-8')).hexdigest()
+
+
+def item_identity(item_date, download_url):
+    """Идентификатор элемента в разделе: дата + имя файла."""
+    date_part = item_date.strftime('%Y-%m-%d') if item_date else ""
+    return f"{date_part}|{media_key(download_url)}"[:255]
+
+
+def make_fingerprint(establishment_id, section, identity, text):
+    caption_hash = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    raw = f"{establishment_id}\x00{section}\x00{identity}\x00{caption_hash}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def upsert_promotion_sync(establishment, section, identity, raw_text):
+    """
+    Создает акцию, если такой еще нет. Возвращает (promotion, created).
+    Существующую акцию не трогаем: ее статус уже мог поменять модератор.
+    """
+    fingerprint = make_fingerprint(establishment.id, section, identity, raw_text)
+    return Promotion.objects.get_or_create(
+        fingerprint=fingerprint,
+        defaults={
+            'establishment': establishment,
+            'raw_text': raw_text,
+            'status': Promotion.STATUS_MODERATION,
+            'source_section': section,
+            'source_item_id': identity,
+        },
+    )
+
+
+def has_media_sync(promotion, source_key):
+    """Есть ли у акции уже скачанный файл с таким ключом."""
+    if not source_key:
+        return False
+    return Media.objects.filter(promotion=promotion, source_key=source_key).exists()
+
+
+upsert_promotion = sync_to_async(upsert_promotion_sync, thread_sensitive=True)
+has_media = sync_to_async(has_media_sync, thread_sensitive=True)
@@ -0,0 +1,43 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+
+from promotions.models import HighlightTitleVerdict
+
+# Сколько названий решено по таблице и сколько ушло в ИИ за запуск
+stats = {'table': 0, 'ai': 0}
+
+
+def normalize_title(title):
+    """Нижний регистр, без эмодзи и знаков препинания: "🔥АКЦИИ!" и "Акции" — одно название."""
+    words = re.sub(r"[^\w\s]", " ", title or "").replace("_", " ").lower().split()
+    return " ".join(words)[:200]
+
+
+def get_verdict_sync(title):
+    """Решение по названию из таблицы или None, если название встречается впервые."""
+    normalized = normalize_title(title)
+    if not normalized:
+        return None
+    verdict = HighlightTitleVerdict.objects.filter(title=normalized).values_list('is_promotion', flat=True).first()
+    if verdict is None:
+        stats['ai'] += 1
+        return None
+    HighlightTitleVerdict.objects.filter(title=normalized).update(hits=F('hits') + 1)
+    stats['table'] += 1
+    return verdict
+
+
+def store_verdict_sync(title, is_promotion):
+    """Запоминает ответ ИИ. Решение администратора (SOURCE_MANUAL) не перезаписывается."""
+    normalized = normalize_title(title)
+    if not normalized:
+        return
+    HighlightTitleVerdict.objects.get_or_create(
+        title=normalized, defaults={'example': title[:200], 'is_promotion': is_promotion, 'hits': 1}
+    )
+
+
+get_verdict = sync_to_async(get_verdict_sync, thread_sensitive=True)
+store_verdict = sync_to_async(store_verdict_sync, thread_sensitive=True)
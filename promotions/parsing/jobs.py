@@ -0,0 +1,126 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from promotions.models import ParseJob
+
+# Как часто воркер отмечается в выполняемом задании (секунды)
+HEARTBEAT_SECONDS = getattr(settings, 'PARSER_JOB_HEARTBEAT_SECONDS', 60)
+# Через сколько минут без отметки задание считается брошенным
+STALE_MINUTES = getattr(settings, 'PARSER_JOB_STALE_MINUTES', 10)
+# Сколько раз задание можно начинать заново; потом оно помечается ошибкой
+MAX_ATTEMPTS = getattr(settings, 'PARSER_JOB_MAX_ATTEMPTS', 3)
+
+
+def make_dedupe_key(params):
+    """Ключ одинаковых заданий: хэш параметров без учета порядка и пустых значений."""
+    normalized = {key: value for key, value in params.items() if value not in (None, False, '', [], {})}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def enqueue(**params):
+    """
+    Ставит задание на парсинг в очередь. Если такое же задание уже ждет в очереди,
+    новое не создается. Возвращает (задание, создано ли новое).
+    """
+    key = make_dedupe_key(params)
+    existing = ParseJob.objects.filter(status=ParseJob.STATUS_PENDING, dedupe_key=key).first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            return ParseJob.objects.create(params=params, dedupe_key=key), True
+    except IntegrityError:
+        # Такое же задание успели поставить параллельно
+        return ParseJob.objects.get(status=ParseJob.STATUS_PENDING, dedupe_key=key), False
+
+
+def recover_stale_sync():
+    """
+    Задания "Выполняется", у которых воркер давно не отмечался (упал, машину остановили),
+    возвращает в очередь — новый воркер продолжит их с контрольной точки job-<id>.
+    Если попытки кончились или такое же задание уже ждет в очереди, помечает ошибкой.
+    Возвращает (возвращено в очередь, помечено ошибкой).
+    """
+    cutoff = timezone.now() - timedelta(minutes=STALE_MINUTES)
+    stale = ParseJob.objects.filter(status=ParseJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    requeued = failed = 0
+    for job in stale:
+        # Условие на heartbeat_at: если воркер успел отметиться, задание не трогаем
+        same = ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_RUNNING, heartbeat_at=job.heartbeat_at)
+        error = ""
+        if job.attempts < MAX_ATTEMPTS:
+            try:
+                with transaction.atomic():
+                    requeued += same.update(status=ParseJob.STATUS_PENDING)
+                continue
+            except IntegrityError:
+                error = "Воркер пропал во время выполнения, а такое же задание уже стоит в очереди."
+        else:
+            error = f"Воркер пропадал во время выполнения {job.attempts} раз(а), задание остановлено."
+        failed += same.update(status=ParseJob.STATUS_FAILED, error=error, finished_at=timezone.now())
+    return requeued, failed
+
+
+def claim_next_sync():
+    """
+    Забирает самое старое задание из очереди. Переход pending -> running
+    делается условным UPDATE, поэтому два воркера не возьмут одно задание.
+    Перед этим возвращает в очередь брошенные задания (recover_stale_sync).
+    """
+    recover_stale_sync()
+    while True:
+        job = ParseJob.objects.filter(status=ParseJob.STATUS_PENDING).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_PENDING).update(
+            status=ParseJob.STATUS_RUNNING, started_at=job.started_at or now, heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def heartbeat_sync(job):
+    """Отметка воркера: задание еще выполняется."""
+    ParseJob.objects.filter(pk=job.pk, status=ParseJob.STATUS_RUNNING).update(heartbeat_at=timezone.now())
+
+
+def start_sync(job, total):
+    job.total_establishments = total
+    job.save(update_fields=['total_establishments'])
+
+
+def record_establishment_sync(job, establishment, result):
+    """Записывает результат одного заведения и обновляет счетчики задания."""
+    job.processed_establishments += 1
+    if result.get('error'):
+        job.failed_establishments += 1
+    job.promotions_found += sum(result.get(section, 0) for section in ('posts', 'stories', 'highlights'))
+    job.results[str(establishment.id)] = result
+    job.save(update_fields=['processed_establishments', 'failed_establishments', 'promotions_found', 'results'])
+
+
+def finish_sync(job, error=""):
+    job.status = ParseJob.STATUS_FAILED if error else ParseJob.STATUS_DONE
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+recover_stale = sync_to_async(recover_stale_sync, thread_sensitive=True)
+claim_next = sync_to_async(claim_next_sync, thread_sensitive=True)
+heartbeat = sync_to_async(heartbeat_sync, thread_sensitive=True)
+start = sync_to_async(start_sync, thread_sensitive=True)
+record_establishment = sync_to_async(record_establishment_sync, thread_sensitive=True)
+finish = sync_to_async(finish_sync, thread_sensitive=True)
@@ -0,0 +1,69 @@
+"""
+Аренда заведений в БД, чтобы несколько процессов парсинга делили один запуск.
+
+Каждый процесс перед парсингом профиля берет на него аренду (ключ запуска + заведение) —
+только когда у него освободился слот браузера, — и продлевает ее, пока парсит.
+Пока аренда не истекла, другие процессы профиль пропускают; после успешного парсинга
+аренда помечается завершенной и больше не выдается. Аренду упавшего процесса
+по истечении срока подхватывает другой.
+"""
+import os
+import socket
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from promotions.models import ParseLease
+
+# На сколько минут выдается аренда (должно хватать на самый долгий профиль)
+LEASE_MINUTES = getattr(settings, 'PARSER_LEASE_MINUTES', 30)
+# Как часто продлевать аренду во время парсинга (секунды)
+RENEW_SECONDS = LEASE_MINUTES * 60 / 3
+
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_sync(run_key, establishment):
+    """Пытается взять заведение. True — можно парсить, False — его уже взял или сделал другой процесс."""
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=LEASE_MINUTES)
+    try:
+        with transaction.atomic():
+            ParseLease.objects.create(run_key=run_key, establishment=establishment, holder=HOLDER, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        pass
+    # Аренда уже есть: забираем ее, только если она не завершена и истекла (или уже наша)
+    taken = ParseLease.objects.filter(
+        Q(expires_at__lt=now) | Q(holder=HOLDER),
+        run_key=run_key, establishment=establishment, completed_at__isnull=True,
+    ).update(holder=HOLDER, expires_at=expires_at)
+    return bool(taken)
+
+
+def renew_sync(run_key, establishment):
+    """Продлевает свою аренду. False — аренды у этого процесса больше нет."""
+    return bool(ParseLease.objects.filter(
+        run_key=run_key, establishment=establishment, holder=HOLDER, completed_at__isnull=True
+    ).update(expires_at=timezone.now() + timedelta(minutes=LEASE_MINUTES)))
+
+
+def complete_sync(run_key, establishment):
+    ParseLease.objects.filter(run_key=run_key, establishment=establishment, holder=HOLDER).update(completed_at=timezone.now())
+
+
+def release_sync(run_key, establishment):
+    """Отдает заведение (например, после ошибки), чтобы его мог взять другой процесс."""
+    ParseLease.objects.filter(
+        run_key=run_key, establishment=establishment, holder=HOLDER, completed_at__isnull=True
+    ).delete()
+
+
+acquire = sync_to_async(acquire_sync, thread_sensitive=True)
+renew = sync_to_async(renew_sync, thread_sensitive=True)
+complete = sync_to_async(complete_sync, thread_sensitive=True)
+release = sync_to_async(release_sync, thread_sensitive=True)
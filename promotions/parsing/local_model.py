@@ -0,0 +1,104 @@
+"""
+Легкий локальный классификатор "акция / не акция" (наивный Байес, без GPU и внешних библиотек).
+
+Обучается на решениях модераторов: опубликованные акции — положительные примеры,
+удаленные — отрицательные. Уверенные ответы позволяют не ходить в OpenRouter,
+сомнительные (между порогами) все так же уходят в ИИ.
+"""
+import math
+import re
+
+from django.conf import settings
+from django.utils import timezone
+
+from promotions.models import ParserState
+
+# Под каким ключом обученная модель лежит в ParserState (в БД: общая для всех воркеров
+# и, в отличие от хранилища медиа, не раздается публично)
+MODEL_KEY = 'promo_classifier'
+# Вероятность "акции", выше которой ИИ не спрашиваем (сразу да)
+YES_THRESHOLD = getattr(settings, 'PARSER_LOCAL_MODEL_YES_THRESHOLD', 0.95)
+# Вероятность "акции", ниже которой ИИ не спрашиваем (сразу нет)
+NO_THRESHOLD = getattr(settings, 'PARSER_LOCAL_MODEL_NO_THRESHOLD', 0.05)
+# Слова, встретившиеся реже, в модель не попадают
+MIN_TOKEN_COUNT = 2
+
+TOKEN_RE = re.compile(r"\w+|%", re.UNICODE)
+
+
+def tokenize(text):
+    """Множество слов текста (без повторов: длинные тексты не перевешивают короткие)."""
+    return set(TOKEN_RE.findall((text or "").lower()))
+
+
+def train(texts, labels):
+    """
+    Обучает модель. labels — True (акция) / False (не акция).
+    Возвращает словарь, который можно сохранить в JSON.
+    """
+    doc_counts = {'1': 0, '0': 0}
+    token_counts = {'1': {}, '0': {}}
+    for text, label in zip(texts, labels):
+        cls = '1' if label else '0'
+        doc_counts[cls] += 1
+        for token in tokenize(text):
+            token_counts[cls][token] = token_counts[cls].get(token, 0) + 1
+
+    vocabulary = {
+        token for token in set(token_counts['1']) | set(token_counts['0'])
+        if token_counts['1'].get(token, 0) + token_counts['0'].get(token, 0) >= MIN_TOKEN_COUNT
+    }
+    classes = {}
+    for cls in ('1', '0'):
+        counts = {token: count for token, count in token_counts[cls].items() if token in vocabulary}
+        classes[cls] = {
+            'doc_count': doc_counts[cls],
+            'token_total': sum(counts.values()),
+            'counts': counts,
+        }
+    return {
+        'version': 1,
+        'trained_at': timezone.now().isoformat(),
+        'vocab_size': len(vocabulary),
+        'classes': classes,
+    }
+
+
+def score(model, text):
+    """Вероятность того, что текст — акция (0..1)."""
+    vocab_size = model['vocab_size'] or 1
+    total_docs = sum(c['doc_count'] for c in model['classes'].values()) or 1
+    classes = model['classes']
+    # Неизвестные модели слова ничего не говорят ни в пользу одного класса
+    tokens = [token for token in tokenize(text) if token in classes['1']['counts'] or token in classes['0']['counts']]
+    log_probs = {}
+    for cls, data in classes.items():
+        log_prob = math.log((data['doc_count'] + 1) / (total_docs + 2))
+        denominator = data['token_total'] + vocab_size
+        for token in tokens:
+            log_prob += math.log((data['counts'].get(token, 0) + 1) / denominator)
+        log_probs[cls] = log_prob
+    diff = log_probs['0'] - log_probs['1']
+    if diff > 700:
+        return 0.0
+    return 1 / (1 + math.exp(diff))
+
+
+def verdict(model, text):
+    """True/False для уверенных оценок, None — если решать должен ИИ."""
+    probability = score(model, text)
+    if probability >= YES_THRESHOLD:
+        return True
+    if probability <= NO_THRESHOLD:
+        return False
+    return None
+
+
+def save_model(model, key=MODEL_KEY):
+    ParserState.objects.update_or_create(key=key, defaults={'value': model})
+    return key
+
+
+def load_model(key=MODEL_KEY):
+    """Загружает модель из БД. Возвращает None, если модель еще не обучена."""
+    return ParserState.objects.filter(key=key).values_list('value', flat=True).first()
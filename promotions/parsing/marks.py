@@ -0,0 +1,36 @@
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from establishments.models import Establishment
+
+from promotions.models import ParseMark
+
+
+def get_marks_sync(establishment):
+    """Возвращает {раздел: дата самого нового обработанного элемента}."""
+    return dict(
+        ParseMark.objects.filter(establishment=establishment).values_list('section', 'newest_item_date')
+    )
+
+
+def save_mark_sync(establishment, section, newest_item_date):
+    """Сдвигает отметку вперед (назад — никогда)."""
+    if newest_item_date is None:
+        return
+    mark, created = ParseMark.objects.get_or_create(
+        establishment=establishment, section=section,
+        defaults={'newest_item_date': newest_item_date},
+    )
+    if not created and newest_item_date > mark.newest_item_date:
+        mark.newest_item_date = newest_item_date
+        mark.save(update_fields=['newest_item_date', 'updated_at'])
+
+
+def mark_parsed_sync(establishment):
+    """Запоминает время успешного парсинга профиля (для запусков "не парсились X часов")."""
+    Establishment.objects.filter(pk=establishment.pk).update(last_parsed_at=timezone.now())
+
+
+get_marks = sync_to_async(get_marks_sync, thread_sensitive=True)
+save_mark = sync_to_async(save_mark_sync, thread_sensitive=True)
+mark_parsed = sync_to_async(mark_parsed_sync, thread_sensitive=True)
@@ -0,0 +1,19 @@
+from contextvars import ContextVar
+
+# Имя профиля, с которым сейчас работает задача парсера.
+# asyncio копирует контекст в каждую задачу, поэтому при параллельном
+# парсинге у каждого профиля свой префикс в логах.
+current_profile = ContextVar('current_profile', default=None)
+
+
+def tag(message):
+    """Добавляет к сообщению префикс текущего профиля (если он задан)."""
+    username = current_profile.get()
+    if not username:
+        return message
+    prefix = f"[{username}] "
+    return "\n".join(prefix + line if line else line for line in str(message).split("\n"))
+
+
+def log(message):
+    print(tag(message))
@@ -0,0 +1,218 @@
+"""
+Конвейер обработки раздела профиля: прокрутка → классификация → скачивание.
+
+Раньше парсер сначала докручивал список до конца, потом классифицировал все тексты
+и только потом скачивал файлы, то есть время раздела было суммой трех этапов.
+Теперь этапы связаны очередями asyncio и работают одновременно: прокрутка отдает
+новые элементы сразу, как они появились, классификатор забирает их пачками,
+а несколько загрузчиков сохраняют подтвержденные акции. Время раздела примерно
+равно времени самого медленного этапа.
+
+Очереди ограничены (QUEUE_SIZE): если ИИ или скачивание не успевают, прокрутка ждет.
+Размеры очередей и время работы каждого этапа копятся в stats (см. report()).
+"""
+import asyncio
+import time
+
+from django.conf import settings
+
+from promotions.parsing.output import log
+
+# Сколько элементов может ждать в каждой очереди
+QUEUE_SIZE = getattr(settings, 'PARSER_PIPELINE_QUEUE_SIZE', 50)
+# Сколько текстов классификатор забирает из очереди за раз (остальное — как успели появиться)
+CLASSIFY_CHUNK = getattr(settings, 'PARSER_PIPELINE_CLASSIFY_CHUNK', 10)
+# Сколько загрузчиков работает одновременно в одном разделе
+DOWNLOADERS = getattr(settings, 'PARSER_PIPELINE_DOWNLOADERS', 4)
+
+# {этап: {'items': обработано, 'wall': секунд, когда этап работал (по часам),
+#         'busy': секунд работы, сложенных по всем исполнителям этапа, 'idle': секунд ожидания очереди}}
+stats = {}
+# {очередь: наибольшая длина за запуск}
+queue_peaks = {}
+
+# Названия этапов для логов
+LABELS = {'scroll': 'прокрутка', 'classify': 'классификация', 'download': 'скачивание'}
+
+_DONE = object()
+
+
+class Stage:
+    """
+    Счетчики одного этапа конвейера в одном разделе. У этапа может быть несколько
+    исполнителей сразу (пачки классификации, загрузчики), поэтому busy — их сумма,
+    а wall — время по часам, когда работал хотя бы один из них.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.wall = 0.0
+        self.idle = 0.0
+        self.running = 0
+        self.since = 0.0
+
+    def begin(self):
+        now = time.monotonic()
+        if not self.running:
+            self.since = now
+        self.running += 1
+        return now
+
+    def end(self, started):
+        now = time.monotonic()
+        self.busy += now - started
+        self.running -= 1
+        if not self.running:
+            self.wall += now - self.since
+
+    def record(self):
+        entry = stats.setdefault(self.name, {'items': 0, 'wall': 0.0, 'busy': 0.0, 'idle': 0.0})
+        entry['items'] += self.items
+        entry['wall'] += self.wall
+        entry['busy'] += self.busy
+        entry['idle'] += self.idle
+
+
+class Pipeline:
+    """
+    produce(emit) — прокрутка: вызывает await emit(record) для каждого нового элемента.
+    classify(records) — список вердиктов (True/False/None) в том же порядке.
+    save(record) — сохраняет подтвержденную акцию (вызывается только для verdict=True).
+    on_verdict(record, verdict) — необязательный обработчик каждого вердикта (логи, отметки).
+    """
+
+    def __init__(self, name, produce, classify, save, on_verdict=None):
+        self.name = name
+        self.produce = produce
+        self.classify = classify
+        self.save = save
+        self.on_verdict = on_verdict
+        self.to_classify = asyncio.Queue(QUEUE_SIZE)
+        self.to_download = asyncio.Queue(QUEUE_SIZE)
+        self.stages = {name: Stage(name) for name in ('scroll', 'classify', 'download')}
+
+    def track(self, queue_name, queue):
+        queue_peaks[queue_name] = max(queue_peaks.get(queue_name, 0), queue.qsize())
+
+    def queue_sizes(self):
+        return f"очереди: классификация {self.to_classify.qsize()}, скачивание {self.to_download.qsize()}"
+
+    async def emit(self, record):
+        await self.to_classify.put(record)
+        self.stages['scroll'].items += 1
+        self.track('classify', self.to_classify)
+
+    async def run_producer(self):
+        stage = self.stages['scroll']
+        started = stage.begin()
+        try:
+            await self.produce(self.emit)
+        finally:
+            stage.end(started)
+        # Маркер конца — только при успешном завершении: при ошибке или отмене run() сам
+        # отменяет все этапы, а очередь может быть полна и без читателя (put ждал бы вечно)
+        await self.to_classify.put(_DONE)
+
+    async def take_chunk(self, stage):
+        """Ждет хотя бы один элемент и добирает то, что уже лежит в очереди (до CLASSIFY_CHUNK)."""
+        waited = time.monotonic()
+        chunk = [await self.to_classify.get()]
+        stage.idle += time.monotonic() - waited
+        while len(chunk) < CLASSIFY_CHUNK and chunk[-1] is not _DONE and not self.to_classify.empty():
+            chunk.append(self.to_classify.get_nowait())
+        return chunk
+
+    async def run_classifier(self):
+        stage = self.stages['classify']
+        pending = set()
+        try:
+            while True:
+                chunk = await self.take_chunk(stage)
+                finished = chunk[-1] is _DONE
+                records = [record for record in chunk if record is not _DONE]
+                if records:
+                    # Пачки классифицируются параллельно: ИИ ограничен общим семафором классификатора
+                    pending.add(asyncio.ensure_future(self.classify_chunk(stage, records)))
+                done = {task for task in pending if task.done()}
+                for task in done:
+                    task.result()  # пробрасываем ошибку классификации
+                pending -= done
+                if finished:
+                    break
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            for task in pending:
+                task.cancel()
+        # Как и у прокрутки, маркеры конца для загрузчиков — только при успешном завершении
+        for _ in range(DOWNLOADERS):
+            await self.to_download.put(_DONE)
+
+    async def classify_chunk(self, stage, records):
+        started = stage.begin()
+        try:
+            verdicts = await self.classify(records)
+        finally:
+            stage.end(started)
+        stage.items += len(records)
+        for record, verdict in zip(records, verdicts):
+            if self.on_verdict:
+                self.on_verdict(record, verdict)
+            if verdict:
+                await self.to_download.put(record)
+                self.track('download', self.to_download)
+
+    async def run_downloader(self):
+        stage = self.stages['download']
+        while True:
+            waited = time.monotonic()
+            record = await self.to_download.get()
+            stage.idle += time.monotonic() - waited
+            if record is _DONE:
+                return
+            started = stage.begin()
+            try:
+                await self.save(record)
+            finally:
+                stage.end(started)
+            stage.items += 1
+
+    async def run(self):
+        """Запускает все этапы и ждет, пока очереди опустеют. Ошибка любого этапа останавливает остальные."""
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(self.run_producer()), asyncio.ensure_future(self.run_classifier())]
+        tasks += [asyncio.ensure_future(self.run_downloader()) for _ in range(DOWNLOADERS)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            for stage in self.stages.values():
+                stage.record()
+        self.log_summary(time.monotonic() - started)
+
+    def log_summary(self, elapsed):
+        # Время этапов — по часам, а не сумма по исполнителям: параллельные пачки
+        # классификации и загрузчики завысили бы выигрыш
+        parts = ", ".join(
+            f"{LABELS[name]} {stage.wall:.1f} с ({stage.items} шт.)" for name, stage in self.stages.items()
+        )
+        total = sum(stage.wall for stage in self.stages.values())
+        log(f"  ⏱ Конвейер '{self.name}': {elapsed:.1f} с вместо {total:.1f} с, если бы этапы шли друг за другом — {parts}.")
+
+
+def report():
+    """Строки для итогового отчета: время этапов и наибольшие длины очередей."""
+    lines = [
+        f"  {LABELS.get(name, name)}: {entry['items']} шт., работа {entry['wall']:.1f} с"
+        f" (сумма по исполнителям {entry['busy']:.1f} с), ожидание очереди {entry['idle']:.1f} с"
+        for name, entry in stats.items()
+    ]
+    if queue_peaks:
+        lines.append("  максимум в очередях: " + ", ".join(f"{LABELS.get(name, name)} {size}" for name, size in sorted(queue_peaks.items())))
+    return lines
@@ -0,0 +1,212 @@
+"""
+Общий ограничитель запросов к внешним хостам (storiesig.info, медиа, OpenRouter, Instagram).
+
+Для каждого хоста — ведро токенов в БД (RateLimitState), так что его делят все задачи
+и все процессы парсера. Скорость подстраивается по принципу AIMD: после каждого
+успешного запроса немного растет, после 429/5xx — падает вдвое. Запросы, получившие
+429/5xx или сетевую ошибку, повторяются с экспоненциальной паузой со случайным разбросом.
+"""
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from promotions.models import RateLimitState
+
+# rate — стартовая скорость (запросов в секунду), min_rate/max_rate — границы AIMD,
+# burst — сколько запросов можно сделать подряд без паузы
+DEFAULT_LIMIT = {'rate': 2.0, 'min_rate': 0.2, 'max_rate': 10.0, 'burst': 3}
+LIMITS = {
+    'storiesig.info': {'rate': 1.0, 'min_rate': 0.1, 'max_rate': 3.0, 'burst': 2},
+    'media.storiesig.info': {'rate': 5.0, 'min_rate': 0.5, 'max_rate': 20.0, 'burst': 5},
+    'openrouter.ai': {'rate': 2.0, 'min_rate': 0.2, 'max_rate': 10.0, 'burst': 5},
+    'www.instagram.com': {'rate': 0.5, 'min_rate': 0.05, 'max_rate': 1.0, 'burst': 1},
+    **getattr(settings, 'PARSER_RATE_LIMITS', {}),
+}
+# На сколько растет скорость после успешного запроса и во сколько раз падает после 429/5xx
+INCREASE_STEP = getattr(settings, 'PARSER_RATE_INCREASE_STEP', 0.05)
+DECREASE_FACTOR = getattr(settings, 'PARSER_RATE_DECREASE_FACTOR', 0.5)
+# Повторы: сколько попыток всего и пауза (с) перед второй попыткой, дальше вдвое больше
+MAX_ATTEMPTS = getattr(settings, 'PARSER_RETRY_ATTEMPTS', 4)
+RETRY_BASE_DELAY = getattr(settings, 'PARSER_RETRY_BASE_DELAY', 2.0)
+RETRY_MAX_DELAY = 60.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# {хост: [запросов, повторов, секунд ожидания токенов]}
+stats = {}
+
+
+class RetryableError(Exception):
+    """Ответ, после которого запрос стоит повторить (429/5xx)."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def host_of(url):
+    return urlparse(url).hostname or url
+
+
+def limit_for(host):
+    return {**DEFAULT_LIMIT, **LIMITS.get(host, {})}
+
+
+def _take_token_sync(host):
+    """Берет токен из ведра. Возвращает 0, если токен взят, иначе сколько секунд подождать."""
+    limit = limit_for(host)
+    now = timezone.now()
+    with transaction.atomic():
+        state, _ = RateLimitState.objects.select_for_update().get_or_create(
+            host=host, defaults={'rate': limit['rate'], 'tokens': limit['burst'], 'updated_at': now}
+        )
+        elapsed = max(0.0, (now - state.updated_at).total_seconds())
+        state.tokens = min(limit['burst'], state.tokens + elapsed * state.rate)
+        state.updated_at = now
+        wait = 0.0
+        if state.tokens >= 1:
+            state.tokens -= 1
+        else:
+            wait = (1 - state.tokens) / state.rate
+        state.save(update_fields=['tokens', 'updated_at'])
+    return wait
+
+
+def adjust_sync(host, success):
+    """AIMD: +INCREASE_STEP после успеха, *DECREASE_FACTOR после 429/5xx."""
+    limit = limit_for(host)
+    with transaction.atomic():
+        state = RateLimitState.objects.select_for_update().filter(host=host).first()
+        if state is None:
+            return
+        if success:
+            if state.rate >= limit['max_rate']:
+                return
+            state.rate = min(limit['max_rate'], state.rate + INCREASE_STEP)
+            state.save(update_fields=['rate'])
+        else:
+            state.rate = max(limit['min_rate'], state.rate * DECREASE_FACTOR)
+            # Сразу после отказа ведро пустое: следующий запрос подождет
+            state.tokens = min(state.tokens, 0)
+            state.throttled += 1
+            state.save(update_fields=['rate', 'tokens', 'throttled'])
+
+
+_take_token = sync_to_async(_take_token_sync, thread_sensitive=True)
+_adjust = sync_to_async(adjust_sync, thread_sensitive=True)
+
+
+def _stats(host):
+    return stats.setdefault(host, [0, 0, 0.0])
+
+
+async def acquire(host):
+    """Ждет, пока хосту можно отправить следующий запрос."""
+    entry = _stats(host)
+    entry[0] += 1
+    while True:
+        wait = await _take_token(host)
+        if not wait:
+            return
+        # Небольшой разброс, чтобы задачи, ждущие одного хоста, не просыпались разом
+        wait += random.uniform(0, wait * 0.1)
+        entry[2] += wait
+        await asyncio.sleep(wait)
+
+
+def acquire_sync(host):
+    """То же, что acquire, для синхронного кода (выполняется в отдельном потоке)."""
+    entry = _stats(host)
+    entry[0] += 1
+    while True:
+        wait = _take_token_sync(host)
+        if not wait:
+            return
+        wait += random.uniform(0, wait * 0.1)
+        entry[2] += wait
+        time.sleep(wait)
+
+
+async def report_success(host):
+    await _adjust(host, True)
+
+
+async def report_throttled(host):
+    await _adjust(host, False)
+
+
+def retry_delay(attempt, retry_after=None):
+    """Экспоненциальная пауза с полным случайным разбросом (или Retry-After, если хост его прислал)."""
+    if retry_after:
+        return min(RETRY_MAX_DELAY, retry_after) + random.uniform(0, 1)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+async def call(host, request, retry_on=()):
+    """
+    Выполняет request() (корутину) с учетом лимита хоста и повторяет ее при
+    RetryableError и исключениях из retry_on. После последней попытки ошибка пробрасывается.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        await acquire(host)
+        try:
+            result = await request()
+        except (RetryableError, *retry_on) as e:
+            if isinstance(e, RetryableError):
+                await report_throttled(host)
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            _stats(host)[1] += 1
+            await asyncio.sleep(retry_delay(attempt, getattr(e, 'retry_after', None)))
+            continue
+        await report_success(host)
+        return result
+
+
+def call_sync(host, request, retry_on=()):
+    """То же, что call, для синхронного кода (выполняется в отдельном потоке)."""
+    for attempt in range(MAX_ATTEMPTS):
+        acquire_sync(host)
+        try:
+            result = request()
+        except (RetryableError, *retry_on) as e:
+            if isinstance(e, RetryableError):
+                adjust_sync(host, False)
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            _stats(host)[1] += 1
+            time.sleep(retry_delay(attempt, getattr(e, 'retry_after', None)))
+            continue
+        adjust_sync(host, True)
+        return result
+
+
+async def observe_response(response):
+    """Подстраивает скорость по ответам, которые получает браузер (сами запросы делает страница)."""
+    host = host_of(response.url)
+    if host not in LIMITS:
+        return
+    if response.status in RETRYABLE_STATUSES:
+        await report_throttled(host)
+
+
+def report():
+    """Строки для итогового отчета по хостам."""
+    return [
+        f"  {host}: запросов {requests}, повторов {retries}, ожидание лимита {waited:.1f} с"
+        for host, (requests, retries, waited) in sorted(stats.items())
+    ]
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from establishments.models import Establishment
+
+# Параметры выборки — одинаковые у команды, воркера и API
+SELECTION_KEYS = ('ids', 'city', 'subcategory', 'category', 'stale_hours')
+
+
+def select_establishments(ids=None, city=None, subcategory=None, category=None, stale_hours=None):
+    """
+    Заведения для выборочного запуска одним запросом (фильтры по индексированным
+    полям: id, city_id, subcategory_id, category_id подкатегории, last_parsed_at).
+    Все условия объединяются через И; без условий — все заведения.
+    """
+    query = Q()
+    if ids:
+        query &= Q(pk__in=ids)
+    if city:
+        query &= Q(city_id=city)
+    if subcategory:
+        query &= Q(subcategory_id=subcategory)
+    if category:
+        query &= Q(subcategory__category_id=category)
+    if stale_hours:
+        threshold = timezone.now() - timedelta(hours=stale_hours)
+        query &= Q(last_parsed_at__isnull=True) | Q(last_parsed_at__lt=threshold)
+    return Establishment.objects.select_related('city__country').filter(query).order_by('id')
+
+
+def selection_params(source):
+    """Оставляет из словаря (опции команды, параметры задания) только заданные параметры выборки."""
+    return {key: source[key] for key in SELECTION_KEYS if source.get(key)}
+
+
+def describe(params):
+    """Короткое описание выборки для логов."""
+    if not params:
+        return "все заведения"
+    return ", ".join(f"{key}={value}" for key, value in params.items())
+
+
+def instagram_handle(establishment):
+    """Нормализованный ник: последняя часть ссылки, без @ и в нижнем регистре."""
+    return establishment.instagram_url.strip().strip('/').split('/')[-1].lstrip('@').lower()
+
+
+def parse_shard(value):
+    """'1/4' -> (1, 4). Номер шарда считается с нуля."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Шард задается как i/n, например 0/4, а не '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Номер шарда должен быть от 0 до {count - 1}")
+    return index, count
+
+
+def shard_of(establishment, count):
+    """Шард заведения: стабильный хэш ника, одинаковый на всех машинах и при любом порядке в БД."""
+    digest = hashlib.sha256(instagram_handle(establishment).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def in_shard(establishments, shard):
+    if not shard:
+        return establishments
+    index, count = shard
+    return [establishment for establishment in establishments if shard_of(establishment, count) == index]
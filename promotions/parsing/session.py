@@ -0,0 +1,86 @@
+"""
+Сессия StoriesIG, общая для всех запусков: куки и согласия браузера (storage state)
+и шаблон прямой ссылки на результаты по профилю.
+
+Состояние лежит в БД (ParserState): оно переживает перезапуск машины, общее для всех
+воркеров и, в отличие от хранилища медиа, не раздается публично. Шаблон ссылки берется
+из настроек (PARSER_PROFILE_URL_TEMPLATE) или выучивается: если после поиска через
+форму в адресе страницы есть ник, адрес
+с подстановкой {username} запоминается, и следующие профили открываются сразу по нему.
+Шаблон, по которому результаты не загрузились, отбрасывается и больше не выучивается.
+"""
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from promotions.models import ParserState
+
+STATE_KEY = 'storiesig_session'
+# Например 'https://storiesig.info/en/?user={username}'; None — выучить после первого поиска
+PROFILE_URL_TEMPLATE = getattr(settings, 'PARSER_PROFILE_URL_TEMPLATE', None)
+PLACEHOLDER = '{username}'
+
+
+def load_sync():
+    """{'storage_state': ..., 'profile_url_template': ..., 'rejected_templates': [...]} или {}."""
+    return ParserState.objects.filter(key=STATE_KEY).values_list('value', flat=True).first() or {}
+
+
+def save_sync(state):
+    state = {**state, 'saved_at': timezone.now().isoformat()}
+    ParserState.objects.update_or_create(key=STATE_KEY, defaults={'value': state})
+
+
+load = sync_to_async(load_sync, thread_sensitive=True)
+save = sync_to_async(save_sync, thread_sensitive=True)
+
+
+def _matches(parts, username):
+    """Номера элементов, которые целиком равны нику."""
+    candidates = {username.casefold(), quote(username).casefold()}
+    return [n for n, part in enumerate(parts) if unquote(part).casefold() in candidates]
+
+
+def learn_template(url, username, home_url):
+    """
+    Шаблон прямой ссылки из адреса страницы с результатами (None, если ника в адресе нет).
+    Ник подставляется вместо одного целого элемента адреса — значения параметра, части якоря
+    или сегмента пути (в этом порядке), иначе ник вроде "en" или "stories" заменил бы часть
+    хоста или /en/. Если совпадений в одном месте несколько, шаблон не выучивается.
+    """
+    if not url or not username or url.rstrip('/') == home_url.rstrip('/'):
+        return None
+    parts = urlsplit(url)
+    pairs = [pair.split('=', 1) for pair in parts.query.split('&')] if parts.query else []
+    values = [pair[1] if len(pair) == 2 else '' for pair in pairs]
+    fragment = parts.fragment.split('/')
+    path = parts.path.split('/')
+    for elements in (values, fragment, path):
+        found = _matches(elements, username)
+        if len(found) > 1:
+            return None
+        if found:
+            elements[found[0]] = PLACEHOLDER
+            break
+    else:
+        return None
+    query = '&'.join(f"{pair[0]}={value}" if len(pair) == 2 else pair[0] for pair, value in zip(pairs, values))
+    return urlunsplit((parts.scheme, parts.netloc, '/'.join(path), query, '/'.join(fragment)))
+
+
+def profile_url(template, username):
+    return template.replace(PLACEHOLDER, quote(username))
+
+
+async def close_popup(page):
+    """
+    Обработчик события "page" контекста: закрывает рекламные окна, которые сайт
+    открывает по клику. Свои страницы (new_page) не трогает — у них нет opener.
+    """
+    try:
+        if await page.opener() is not None:
+            await page.close()
+    except Exception:
+        pass
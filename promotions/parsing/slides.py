@@ -0,0 +1,64 @@
+"""
+Учет уже скачанных слайдов "Актуального" по (заведение, название хайлайта).
+Ключ слайда — media_key ссылки на скачивание (имя файла в Instagram), он не меняется между запусками.
+"""
+from asgiref.sync import sync_to_async
+
+from promotions.models import HighlightSlide, Media, Promotion
+from promotions.parsing.highlight_titles import normalize_title
+
+
+def known_slides_sync(establishment, title, keys):
+    """
+    {ключ слайда: id акции} для уже известных слайдов этого хайлайта.
+    Если хайлайт еще не отслеживается, слайды ищутся среди файлов прошлых акций
+    из "Актуального" (скачанных до появления учета) и сразу заносятся в учет.
+    """
+    normalized = normalize_title(title)
+    known = dict(
+        HighlightSlide.objects.filter(establishment=establishment, title=normalized, slide_key__in=keys)
+        .values_list('slide_key', 'promotion_id')
+    )
+    missing = [key for key in keys if key and key not in known]
+    if missing:
+        legacy = dict(
+            Media.objects.filter(
+                promotion__establishment=establishment,
+                promotion__source_section=Promotion.SOURCE_HIGHLIGHTS,
+                source_key__in=missing,
+            ).values_list('source_key', 'promotion_id')
+        )
+        if legacy:
+            HighlightSlide.objects.bulk_create([
+                HighlightSlide(establishment=establishment, title=normalized, slide_key=key, promotion_id=promotion_id)
+                for key, promotion_id in legacy.items()
+            ], ignore_conflicts=True)
+            known.update(legacy)
+    return known
+
+
+def current_promotion_sync(known):
+    """
+    Акция, к которой добавлять новые слайды: самая свежая из известных, если она еще на модерации.
+    К опубликованной не добавляем — новые файлы попали бы в ленту без проверки; тогда (и если
+    акцию удалили) возвращаем None, и для новых слайдов создается новая акция на модерацию.
+    """
+    promotion_ids = {promotion_id for promotion_id in known.values() if promotion_id}
+    if not promotion_ids:
+        return None
+    latest = Promotion.objects.filter(pk__in=promotion_ids).order_by('-created_at', '-id').first()
+    if latest is None or latest.status != Promotion.STATUS_MODERATION:
+        return None
+    return latest
+
+
+def remember_slide_sync(establishment, title, key, promotion):
+    HighlightSlide.objects.get_or_create(
+        establishment=establishment, title=normalize_title(title), slide_key=key,
+        defaults={'promotion': promotion},
+    )
+
+
+known_slides = sync_to_async(known_slides_sync, thread_sensitive=True)
+current_promotion = sync_to_async(current_promotion_sync, thread_sensitive=True)
+remember_slide = sync_to_async(remember_slide_sync, thread_sensitive=True)
@@ -0,0 +1,120 @@
+"""
+Ожидания по событиям вместо фиксированных пауз.
+
+Раньше парсер просто спал (8 с после открытия сторис, 2.5 с на каждый скролл и т.д.).
+Теперь он ждет конкретного сигнала — список элементов изменился и перестал расти —
+но не дольше "потолка", равного старой паузе. Время каждого ожидания пишется в лог
+и суммируется в stats, чтобы было видно экономию.
+"""
+import time
+
+from django.conf import settings
+from playwright.async_api import TimeoutError
+
+from promotions.parsing.output import log
+
+# Потолки ожиданий в миллисекундах (по умолчанию — старые фиксированные паузы)
+CEILINGS = {
+    'posts': 5000,
+    'stories': 8000,
+    'highlights': 5000,
+    'scroll': 2500,
+    'highlight_open': 6000,
+    'highlights_tab': 2000,
+    'scroll_up': 1000,
+    **getattr(settings, 'PARSER_WAIT_CEILINGS', {}),
+}
+# Список считается загруженным, если число элементов не менялось столько миллисекунд
+SETTLE_MS = getattr(settings, 'PARSER_WAIT_SETTLE_MS', 400)
+
+# {название ожидания: [сколько раз, сколько секунд всего, сколько секунд сэкономлено]}
+stats = {}
+
+_SNAPSHOT_JS = """
+(selector) => {
+    const items = document.querySelectorAll(selector);
+    return [items.length, items.length ? (items[0].textContent || '') : ''];
+}
+"""
+
+_CHANGED_JS = """
+([selector, prevCount, prevFirst]) => {
+    const items = document.querySelectorAll(selector);
+    if (items.length === 0) return false;
+    if (prevFirst === null) return items.length > prevCount;
+    if (items.length !== prevCount) return true;
+    return (items[0].textContent || '') !== prevFirst;
+}
+"""
+
+
+async def snapshot(page, selector):
+    """Запоминает состояние списка (кол-во элементов и текст первого) перед действием."""
+    return await page.evaluate(_SNAPSHOT_JS, selector)
+
+
+def _record(name, started, ceiling_ms, ready):
+    elapsed = time.monotonic() - started
+    saved = max(0.0, ceiling_ms / 1000 - elapsed)
+    entry = stats.setdefault(name, [0, 0.0, 0.0])
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] += saved
+    status = "готово" if ready else "потолок"
+    log(f"      ⏱ Ожидание '{name}': {elapsed:.1f} с ({status}, максимум {ceiling_ms / 1000:.1f} с)")
+    return ready
+
+
+async def _settle(page, selector, deadline):
+    """Ждет, пока список перестанет расти (или до дедлайна)."""
+    last_count = await page.locator(selector).count()
+    stable_since = time.monotonic()
+    while time.monotonic() < deadline:
+        await page.wait_for_timeout(100)
+        count = await page.locator(selector).count()
+        if count != last_count:
+            last_count = count
+            stable_since = time.monotonic()
+        elif (time.monotonic() - stable_since) * 1000 >= SETTLE_MS:
+            return
+
+
+async def wait_for_list_change(page, selector, before, name):
+    """
+    Ждет, пока список по selector изменится относительно снимка before
+    (появятся элементы, изменится их число или первый элемент), и затем перестанет расти.
+    Возвращает True, если изменение произошло до потолка.
+    """
+    ceiling_ms = CEILINGS[name]
+    started = time.monotonic()
+    prev_count, prev_first = before
+    try:
+        await page.wait_for_function(_CHANGED_JS, arg=[selector, prev_count, prev_first], timeout=ceiling_ms, polling=100)
+    except TimeoutError:
+        return _record(name, started, ceiling_ms, False)
+    await _settle(page, selector, started + ceiling_ms / 1000)
+    return _record(name, started, ceiling_ms, True)
+
+
+async def wait_for_count_above(page, selector, previous_count, name):
+    """Ждет, пока элементов станет больше previous_count (подгрузка при скролле)."""
+    return await wait_for_list_change(page, selector, [previous_count, None], name)
+
+
+async def wait_for_visible(page, selector, name):
+    """Ждет, пока первый элемент по selector станет видимым."""
+    ceiling_ms = CEILINGS[name]
+    started = time.monotonic()
+    try:
+        await page.locator(selector).first.wait_for(state='visible', timeout=ceiling_ms)
+    except TimeoutError:
+        return _record(name, started, ceiling_ms, False)
+    return _record(name, started, ceiling_ms, True)
+
+
+def report():
+    """Строки для итогового отчета: сколько времени ушло на ожидания и сколько сэкономлено."""
+    return [
+        f"  {name}: {count} раз, {total:.1f} с всего, сэкономлено {saved:.1f} с"
+        for name, (count, total, saved) in sorted(stats.items())
+    ]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
  
-from promotions.models import Promotion, Media
+from promotions.models import Promotion, Media, ParseJob
 from establishments.models import Establishment
 from categories.models import Category, Subcategory
 from locations.models import City, Country
@@ -29,10 +30,40 @@ class EstablishmentSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'instagram_url', 'city', 'subcategory']
 
 class MediaSerializer(serializers.ModelSerializer):
-    """Сериализатор для Медиафайлов."""
+    """
+    Сериализатор для Медиафайлов.
+    thumbnail_url (для карточек) и medium_url (для просмотра) — уменьшенные копии;
+    пока копий нет (видео или старый файл), в них ссылка на оригинал.
+    Размеры и длительность позволяют разметить карточку до загрузки файла (None — неизвестно).
+    У старых файлов без записи в хранилище (blob=None) поля из blob тоже есть, со значением None.
+    """
+    file_url = serializers.SerializerMethodField()
+    size = serializers.IntegerField(source='blob.size', read_only=True, default=None)
+    sha256 = serializers.CharField(source='blob.sha256', read_only=True, default=None)
+    mime_type = serializers.CharField(source='blob.mime_type', read_only=True, default=None)
+    width = serializers.IntegerField(source='blob.width', read_only=True, default=None)
+    height = serializers.IntegerField(source='blob.height', read_only=True, default=None)
+    duration = serializers.FloatField(source='blob.duration', read_only=True, default=None)
+    thumbnail_url = serializers.SerializerMethodField()
+    medium_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Media
-        fields = ['id', 'file_path', 'file_type']
+        fields = ['id', 'file_path', 'file_type', 'file_url', 'thumbnail_url', 'medium_url',
+                  'size', 'sha256', 'mime_type', 'width', 'height', 'duration']
+
+    def get_file_url(self, obj):
+        return default_storage.url(obj.file_path)
+
+    def get_thumbnail_url(self, obj):
+        return self.derivative_url(obj, 'thumbnail_path')
+
+    def get_medium_url(self, obj):
+        return self.derivative_url(obj, 'medium_path')
+
+    def derivative_url(self, obj, field):
+        path = getattr(obj.blob, field, '') if obj.blob_id else ''
+        return default_storage.url(path or obj.file_path)
 
 class PromotionSerializer(serializers.ModelSerializer):
     """
@@ -100,4 +131,33 @@ class AdminPromotionCreateSerializer(serializers.Serializer):
         required=False, 
         allow_blank=True,
         help_text="Условия и дни проведения"
-    )
\ No newline at end of file
+    )
+
+
+class ParseTriggerSerializer(serializers.Serializer):
+    """
+    Параметры выборочного запуска парсера. Все поля необязательны:
+    без них парсятся все заведения.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=True,
+                                help_text="ID заведений")
+    city = serializers.IntegerField(required=False, min_value=1, help_text="ID города")
+    subcategory = serializers.IntegerField(required=False, min_value=1, help_text="ID подкатегории")
+    category = serializers.IntegerField(required=False, min_value=1, help_text="ID категории")
+    stale_hours = serializers.FloatField(required=False, min_value=0,
+                                         help_text="Только заведения, которые не парсились столько часов")
+    full = serializers.BooleanField(required=False, default=False,
+                                    help_text="Игнорировать отметки прошлых запусков")
+
+
+class ParseJobSerializer(serializers.ModelSerializer):
+    """Сериализатор для статуса задания на парсинг."""
+    duration_seconds = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ParseJob
+        fields = [
+            'id', 'status', 'params', 'error',
+            'total_establishments', 'processed_establishments', 'failed_establishments', 'promotions_found',
+            'results', 'created_at', 'started_at', 'finished_at', 'heartbeat_at', 'attempts', 'duration_seconds',
+        ]
@@ -1,3 +1,398 @@
-from django.test import TestCase
+import asyncio
+import io
+import struct
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from categories.models import Category, Subcategory
+from establishments.models import Establishment
+from locations.models import City, Country
+from promotions import mediainfo
+from promotions.management.commands.parse_instagram import Command as ParseCommand
+from promotions.models import ParseJob, ParseLease
+from promotions.parsing import jobs, leases, local_model, pipeline, session
+from promotions.parsing.classifier import parse_batch_answer
+from promotions.parsing.fingerprint import media_key
+from promotions.parsing.selection import parse_shard, shard_of
+
+
+class PipelineTests(SimpleTestCase):
+    """Конвейер прокрутка → классификация → скачивание (promotions.parsing.pipeline)."""
+
+    def run_pipeline(self, items, classify, save):
+        async def produce(emit):
+            for item in items:
+                await emit(item)
+
+        flow = pipeline.Pipeline('test', produce, classify, save)
+        # Зависание конвейера — это и есть ошибка, поэтому ждем с таймаутом
+        return asyncio.run(asyncio.wait_for(flow.run(), timeout=5))
+
+    def test_all_approved_items_are_saved(self):
+        saved = []
+
+        async def classify(records):
+            return [record % 2 == 0 for record in records]
+
+        async def save(record):
+            saved.append(record)
+
+        self.run_pipeline(range(120), classify, save)
+        self.assertEqual(sorted(saved), list(range(0, 120, 2)))
+
+    def test_failing_stage_does_not_hang_with_full_queues(self):
+        # Классификация медленнее прокрутки, поэтому очередь заполнена, когда скачивание падает
+        async def classify(records):
+            await asyncio.sleep(0.05)
+            return [True] * len(records)
+
+        async def save(record):
+            raise RuntimeError("storage is down")
+
+        with self.assertRaises(RuntimeError):
+            self.run_pipeline(range(200), classify, save)
+
+    def test_failing_producer_does_not_hang(self):
+        async def produce(emit):
+            for item in range(200):
+                await emit(item)
+            raise RuntimeError("page crashed")
+
+        async def classify(records):
+            await asyncio.sleep(1)
+            return [False] * len(records)
+
+        async def save(record):
+            pass
+
+        flow = pipeline.Pipeline('test', produce, classify, save)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(asyncio.wait_for(flow.run(), timeout=5))
+
+
+class BatchAnswerTests(SimpleTestCase):
+    """Разбор пакетного ответа ИИ (classifier.parse_batch_answer)."""
+
+    def test_answers_by_number(self):
+        self.assertEqual(parse_batch_answer('{"1": "да", "2": "нет", "3": "Да."}', 3), [True, False, True])
+
+    def test_json_inside_text_and_bracketed_keys(self):
+        answer = 'Вот ответ:\n{"[2]": "нет", "[1]": "да"}\nГотово.'
+        self.assertEqual(parse_batch_answer(answer, 2), [True, False])
+
+    def test_missing_and_out_of_range_numbers_are_unknown(self):
+        self.assertEqual(parse_batch_answer('{"1": "да", "5": "да", "x": "нет"}', 3), [True, None, None])
+
+    def test_unparseable_answer(self):
+        self.assertEqual(parse_batch_answer('да, нет, да', 3), [None, None, None])
+        self.assertEqual(parse_batch_answer('{"1": да}', 2), [None, None])
+
+
+class LocalModelTests(TestCase):
+    """Локальный классификатор (promotions.parsing.local_model)."""
+
+    TEXTS = [
+        "Скидка 20% на все меню", "Акция: второй кофе в подарок", "Скидка 50% на десерты в пятницу",
+        "Акция выходного дня: скидка на пиццу", "Новое меню уже в кафе", "Мы открылись после ремонта",
+        "Фото с нашего вечера", "Новое меню завтраков",
+    ]
+    LABELS = [True, True, True, True, False, False, False, False]
+
+    def setUp(self):
+        self.model = local_model.train(self.TEXTS, self.LABELS)
+
+    def test_train_counts_documents_and_drops_rare_tokens(self):
+        self.assertEqual(self.model['classes']['1']['doc_count'], 4)
+        self.assertEqual(self.model['classes']['0']['doc_count'], 4)
+        self.assertIn('скидка', self.model['classes']['1']['counts'])
+        # Слово встретилось один раз — в словарь не попадает
+        self.assertNotIn('пиццу', self.model['classes']['1']['counts'])
+
+    def test_score_separates_classes(self):
+        self.assertGreater(local_model.score(self.model, "Скидка на меню"), 0.5)
+        self.assertLess(local_model.score(self.model, "Новое меню"), 0.5)
+
+    def test_unknown_words_keep_the_prior(self):
+        self.assertAlmostEqual(local_model.score(self.model, "совершенно незнакомые слова"), 0.5)
+
+    def test_model_is_saved_in_the_database(self):
+        self.assertIsNone(local_model.load_model())
+        local_model.save_model(self.model)
+        self.assertEqual(local_model.load_model()['classes'], self.model['classes'])
+
+
+class MediaKeyTests(SimpleTestCase):
+    """Стабильный ключ медиафайла (fingerprint.media_key)."""
+
+    def test_file_name_of_embedded_instagram_url(self):
+        url = ("https://media.storiesig.info/get?uri=https%3A%2F%2Fscontent.cdninstagram.com%2Fv%2Ft51%2F"
+               "123_456_n.jpg%3Fstp%3Ddst-jpg%26oh%3Dabc%26oe%3D1&filename=x.jpg")
+        self.assertEqual(media_key(url), "123_456_n.jpg")
+
+    def test_signatures_do_not_change_the_key(self):
+        first = "https://scontent.cdninstagram.com/v/t51/123_n.mp4?oh=aaa&oe=111&_nc_ohc=x"
+        second = "https://scontent.cdninstagram.com/v/t51/123_n.mp4?oh=bbb&oe=222&_nc_ohc=y"
+        self.assertEqual(media_key(first), media_key(second))
+
+    def test_proxy_links_without_file_name_get_distinct_keys(self):
+        self.assertNotEqual(media_key("/get?token=abc"), media_key("/get?token=def"))
+        self.assertNotEqual(media_key("/get?token=abc"), "get")
+
+    def test_proxy_key_ignores_volatile_params_and_order(self):
+        self.assertEqual(
+            media_key("https://proxy.example/get?token=abc&dl=1&oe=1"),
+            media_key("https://PROXY.example/get?dl=1&token=abc&oe=2"),
+        )
+
+    def test_empty_url(self):
+        self.assertEqual(media_key(None), "")
+        self.assertEqual(media_key(""), "")
+
+
+class RecoverStaleJobsTests(TestCase):
+    """Задания, брошенные упавшим воркером (jobs.recover_stale_sync)."""
+
+    def running_job(self, minutes_silent, attempts=1):
+        job, _ = jobs.enqueue(account_id=1)
+        heartbeat_at = timezone.now() - timedelta(minutes=minutes_silent)
+        ParseJob.objects.filter(pk=job.pk).update(
+            status=ParseJob.STATUS_RUNNING, started_at=heartbeat_at, heartbeat_at=heartbeat_at, attempts=attempts,
+        )
+        return job
+
+    def test_silent_job_goes_back_to_the_queue(self):
+        job = self.running_job(jobs.STALE_MINUTES + 1)
+        self.assertEqual(jobs.recover_stale_sync(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ParseJob.STATUS_PENDING)
+        # Следующий воркер забирает его снова и считает попытку
+        claimed = jobs.claim_next_sync()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+
+    def test_job_with_recent_heartbeat_is_left_alone(self):
+        job = self.running_job(1)
+        self.assertEqual(jobs.recover_stale_sync(), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ParseJob.STATUS_RUNNING)
+
+    def test_job_out_of_attempts_fails(self):
+        job = self.running_job(jobs.STALE_MINUTES + 1, attempts=jobs.MAX_ATTEMPTS)
+        self.assertEqual(jobs.recover_stale_sync(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ParseJob.STATUS_FAILED)
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_job_with_identical_pending_job_fails(self):
+        job = self.running_job(jobs.STALE_MINUTES + 1)
+        twin, created = jobs.enqueue(account_id=1)
+        self.assertTrue(created)
+        self.assertEqual(jobs.recover_stale_sync(), (0, 1))
+        job.refresh_from_db()
+        twin.refresh_from_db()
+        self.assertEqual((job.status, twin.status), (ParseJob.STATUS_FAILED, ParseJob.STATUS_PENDING))
+
+
+class ShardTests(SimpleTestCase):
+    """Разбиение заведений на шарды (selection.parse_shard, shard_of)."""
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        for value in ('4/4', '-1/4', '0/0', '1', 'a/b'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_shard_depends_only_on_the_handle(self):
+        first = Establishment(instagram_url='https://www.instagram.com/Some_Cafe/')
+        second = Establishment(instagram_url='https://instagram.com/@some_cafe')
+        self.assertEqual(shard_of(first, 7), shard_of(second, 7))
+        self.assertIn(shard_of(first, 7), range(7))
+
+    def test_shards_cover_all_establishments_once(self):
+        establishments = [Establishment(instagram_url=f'https://instagram.com/cafe{n}') for n in range(50)]
+        shards = [shard_of(establishment, 3) for establishment in establishments]
+        self.assertEqual(set(shards), {0, 1, 2})
+
+
+class LeaseSlotTests(TestCase):
+    """Аренда берется на заведение, только когда освободился слот, и продлевается во время парсинга."""
+
+    def setUp(self):
+        city = City.objects.create(name='Алматы', country=Country.objects.create(name='Казахстан'))
+        subcategory = Subcategory.objects.create(name='Кафе', category=Category.objects.create(name='Еда'))
+        self.establishments = [
+            Establishment.objects.create(
+                name=f'Кафе {n}', instagram_url=f'https://instagram.com/cafe{n}', city=city, subcategory=subcategory
+            )
+            for n in range(4)
+        ]
+        self.held = []
+        self.parsed = []
+
+    def make_command(self):
+        command = ParseCommand(stdout=io.StringIO())
+        command.run_key = 'test-run'
+        command.start_date = command.end_date = timezone.now()
+
+        async def process_establishment(slot, establishment, username):
+            # Сколько незавершенных аренд держит процесс, пока парсит профиль
+            self.held.append(await sync_to_async(
+                ParseLease.objects.filter(run_key='test-run', holder=leases.HOLDER, completed_at__isnull=True).count
+            )())
+            self.parsed.append(username)
+            await asyncio.sleep(0.05)
+            return {}
+
+        async def reset_slot(slot):
+            return slot
+
+        command.process_establishment = process_establishment
+        command.reset_slot = reset_slot
+        return command
+
+    async def run_slots(self, slots):
+        pool = asyncio.Queue()
+        for _ in range(slots):
+            pool.put_nowait({'blocker': None, 'profiles': 0})
+        await self.make_command().run_establishments(pool, self.establishments)
+        return pool
+
+    async def test_one_lease_per_busy_slot(self):
+        pool = await self.run_slots(1)
+        self.assertEqual(self.held, [1, 1, 1, 1])
+        self.assertEqual(pool.qsize(), 1)
+        completed = await sync_to_async(ParseLease.objects.filter(completed_at__isnull=False).count)()
+        self.assertEqual(completed, 4)
+
+    async def test_leases_never_exceed_slots(self):
+        await self.run_slots(2)
+        self.assertEqual(sorted(self.parsed), [f'cafe{n}' for n in range(4)])
+        self.assertLessEqual(max(self.held), 2)
+
+    async def test_leased_elsewhere_is_skipped(self):
+        await sync_to_async(ParseLease.objects.create)(
+            run_key='test-run', establishment=self.establishments[0], holder='other:1',
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        await self.run_slots(1)
+        self.assertEqual(self.parsed, ['cafe1', 'cafe2', 'cafe3'])
+
+    async def test_lease_is_renewed_while_parsing(self):
+        renew = mock.AsyncMock(return_value=True)
+        with mock.patch.object(leases, 'RENEW_SECONDS', 0.01), mock.patch.object(leases, 'renew', renew):
+            await self.run_slots(1)
+        self.assertGreaterEqual(renew.await_count, 4)
+        self.assertEqual({call.args[1] for call in renew.await_args_list}, set(self.establishments))
+
+
+def mp4_box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+class MediaInfoTests(SimpleTestCase):
+    """Метаданные файлов (mediainfo.probe), в том числе обрезанных."""
+
+    def make_mp4(self):
+        """ftyp + moov(mvhd: 12.5 с, trak(tkhd: 1080x1920)) + mdat; возвращает файл и конец mvhd."""
+        mvhd = mp4_box(b'mvhd', bytes(4) + bytes(8) + struct.pack('>II', 1000, 12500) + bytes(80))
+        tkhd = mp4_box(b'tkhd', bytes(4) + bytes(20) + bytes(52) + struct.pack('>II', 1080 << 16, 1920 << 16))
+        head = mp4_box(b'ftyp', b'isom' + bytes(4) + b'isom')
+        data = head + mp4_box(b'moov', mvhd + mp4_box(b'trak', tkhd)) + mp4_box(b'mdat', bytes(64))
+        return data, len(head) + 8 + len(mvhd)
+
+    def probe(self, data):
+        return mediainfo.probe(io.BytesIO(data))
+
+    def test_full_mp4(self):
+        data, _ = self.make_mp4()
+        self.assertEqual(
+            self.probe(data), {'mime_type': 'video/mp4', 'width': 1080, 'height': 1920, 'duration': 12.5}
+        )
+
+    def test_mp4_cut_inside_tkhd_keeps_the_duration(self):
+        data, mvhd_end = self.make_mp4()
+        info = self.probe(data[:mvhd_end + 40])
+        self.assertEqual((info['duration'], info['width'], info['height']), (12.5, None, None))
+
+    def test_mp4_cut_inside_mvhd(self):
+        data, mvhd_end = self.make_mp4()
+        self.assertEqual(
+            self.probe(data[:mvhd_end - 90]), {'mime_type': 'video/mp4', 'width': None, 'height': None, 'duration': None}
+        )
+
+    def test_short_mp4_header(self):
+        data, _ = self.make_mp4()
+        # 36 — файл кончается сразу после заголовка mvhd (раньше падало с IndexError)
+        for size in (12, 36, 40):
+            self.assertEqual(self.probe(data[:size])['mime_type'], 'video/mp4')
+
+    def test_truncated_large_box_size(self):
+        # Атом с 64-битным размером, у которого сам размер обрезан
+        data = mp4_box(b'ftyp', b'isom' + bytes(8)) + struct.pack('>I4s', 1, b'moov') + b'\x00\x00'
+        self.assertEqual(self.probe(data)['duration'], None)
+
+    def test_image_size(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 20)).save(buffer, 'PNG')
+        self.assertEqual(
+            self.probe(buffer.getvalue()), {'mime_type': 'image/png', 'width': 30, 'height': 20, 'duration': None}
+        )
+
+    def test_unknown_format(self):
+        self.assertEqual(self.probe(b'hello world')['mime_type'], '')
+
+
+class SessionTemplateTests(TestCase):
+    """Шаблон прямой ссылки на профиль (session.learn_template) и хранение сессии."""
+
+    HOME = 'https://storiesig.info/en/'
+
+    def learn(self, url, username):
+        return session.learn_template(url, username, self.HOME)
+
+    def test_query_value(self):
+        self.assertEqual(self.learn('https://storiesig.info/en/?user=cafe', 'cafe'), 'https://storiesig.info/en/?user={username}')
+
+    def test_path_segment(self):
+        self.assertEqual(
+            self.learn('https://storiesig.info/en/profile/Cafe/', 'cafe'), 'https://storiesig.info/en/profile/{username}/'
+        )
+
+    def test_fragment(self):
+        self.assertEqual(self.learn('https://storiesig.info/en/#cafe', 'cafe'), 'https://storiesig.info/en/#{username}')
+
+    def test_encoded_handle(self):
+        self.assertEqual(self.learn('https://storiesig.info/en/?user=caf%C3%A9', 'café'), 'https://storiesig.info/en/?user={username}')
+
+    def test_handle_equal_to_part_of_the_address(self):
+        # Ник совпадает с /en/ или частью хоста — заменяется только значение параметра
+        self.assertEqual(self.learn('https://storiesig.info/en/?user=en', 'en'), 'https://storiesig.info/en/?user={username}')
+        self.assertEqual(
+            self.learn('https://storiesig.info/en/?user=stories', 'stories'), 'https://storiesig.info/en/?user={username}'
+        )
+
+    def test_partial_match_is_not_learned(self):
+        self.assertIsNone(self.learn('https://storiesig.info/en/?user=cafe_bar', 'cafe'))
+        self.assertIsNone(self.learn('https://storiesig.info/en/cafe-menu', 'cafe'))
+
+    def test_ambiguous_match_is_not_learned(self):
+        self.assertIsNone(self.learn('https://storiesig.info/en/?q=en&lang=en', 'en'))
+
+    def test_home_page_is_not_learned(self):
+        self.assertIsNone(self.learn('https://storiesig.info/en', 'cafe'))
+
+    def test_profile_url_quotes_the_handle(self):
+        self.assertEqual(session.profile_url('https://storiesig.info/en/?user={username}', 'a b'), 'https://storiesig.info/en/?user=a%20b')
+
+    def test_state_round_trip(self):
+        self.assertEqual(session.load_sync(), {})
+        session.save_sync({'profile_url_template': 'https://storiesig.info/en/?user={username}'})
+        state = session.load_sync()
+        self.assertEqual(state['profile_url_template'], 'https://storiesig.info/en/?user={username}')
+        self.assertIn('saved_at', state)
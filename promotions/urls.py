@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import PromotionListView, ModerationListView, ModerationDetailView, TriggerParseView, PublishedListView, PromotionCreateView
+from .views import PromotionListView, ModerationListView, ModerationDetailView, TriggerParseView, PublishedListView, PromotionCreateView, ParseJobDetailView
 
 urlpatterns = [
     path('promotions/', PromotionListView.as_view(), name='promotion-list'),    
@@ -9,6 +9,7 @@ urlpatterns = [
     
     path('moderation-promo/<int:pk>/', ModerationDetailView.as_view(), name='moderation-detail'),
     path('trigger-parse/', TriggerParseView.as_view(), name='trigger-parse'),
+    path('parse-jobs/<int:pk>/', ParseJobDetailView.as_view(), name='parse-job-detail'),
 
     path('admin/promotions/create/', PromotionCreateView.as_view(), name='admin-promotion-create'),
 ]
\ No newline at end of file
@@ -1,18 +1,25 @@
 from rest_framework import generics, permissions, status
 from rest_framework.exceptions import ValidationError
-from .models import Promotion, Media
-from .serializers import PromotionSerializer, PromotionUpdateSerializer, AdminPromotionCreateSerializer
+from django.db.models import Prefetch
+from .models import Promotion, Media, ParseJob
+from .serializers import PromotionSerializer, PromotionUpdateSerializer, AdminPromotionCreateSerializer, ParseJobSerializer, ParseTriggerSerializer
+from . import blobs, derivatives
+from .parsing import jobs
+from .parsing.selection import selection_params
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.core.management import call_command
 from django.utils import timezone
-import threading
 
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.core.files.storage import default_storage
 from establishments.models import Establishment
-import datetime
+
+def with_related(queryset):
+    """Подгружает заведение и медиафайлы (вместе с уменьшенными копиями) без запроса на каждую акцию."""
+    return queryset.select_related('establishment__city__country', 'establishment__subcategory').prefetch_related(
+        Prefetch('media', queryset=Media.objects.select_related('blob'))
+    )
+
 
 class PromotionListView(generics.ListAPIView):
     """
@@ -26,7 +33,7 @@ class PromotionListView(generics.ListAPIView):
         Этот метод определяет, какие данные отдавать.
         Он переопределен для добавления фильтрации.
         """
-        queryset = Promotion.objects.filter(status='published').order_by('-published_at')
+        queryset = with_related(Promotion.objects.filter(status='published').order_by('-published_at'))
         city_id = self.request.query_params.get('city')
         if city_id is not None:
             queryset = queryset.filter(establishment__city_id=city_id)
@@ -43,7 +50,7 @@ class PublishedListView(generics.ListAPIView):
     def get_queryset(self):
         """Отдает только акции со статусом 'published'."""
         # Мы также можем добавить фильтрацию по городу, как в PromotionListView
-        queryset = Promotion.objects.filter(status='published').order_by('-published_at')
+        queryset = with_related(Promotion.objects.filter(status='published').order_by('-published_at'))
         city_id = self.request.query_params.get('city')
         if city_id is not None:
             queryset = queryset.filter(establishment__city_id=city_id)
@@ -59,7 +66,7 @@ class ModerationListView(generics.ListAPIView):
 
     def get_queryset(self):
         """Отдает только акции со статусом 'moderation'."""
-        return Promotion.objects.filter(status='moderation').order_by('-created_at')
+        return with_related(Promotion.objects.filter(status='moderation').order_by('-created_at'))
 
 
 class ModerationDetailView(generics.RetrieveUpdateAPIView):
@@ -163,6 +170,7 @@ class PromotionCreateView(APIView):
                 edited_text=validated_data['edited_text'],
                 conditions=validated_data.get('conditions', ''),
                 raw_text="Добавлено вручную администратором", # Заглушка
+                source_section=Promotion.SOURCE_MANUAL,
                 status=Promotion.STATUS_PUBLISHED, # Сразу публикуем
                 published_at=timezone.now() # Устанавливаем дату публикации
             )
@@ -179,32 +187,26 @@ class PromotionCreateView(APIView):
             
             print(f"Начинаю обработку {len(uploaded_files)} медиафайлов...")
 
-            # Создаем путь для сохранения, похожий на тот, что в парсере
-            today_str = datetime.datetime.now().strftime('%Y-%m-%d')
-            username_safe = establishment.instagram_url.strip('/').split('/')[-1]
-            base_folder_path = (
-                f"{establishment.city.country.name}/{establishment.city.name}/"
-                f"{username_safe}/{today_str}/Manually_Added"
-            )
-
             for file in uploaded_files:
                 file_type_string = 'video' if 'video' in file.content_type else 'image'
                 
-                # Генерируем уникальное имя файла для хранилища
-                # (Включаем ID акции, чтобы избежать конфликтов)
-                file_save_path = f"{base_folder_path}/promo_{new_promo.id}_{file.name}"
-                
-                # 4. Сохраняем файл в облачное хранилище (S3/R2 и т.д.)
+                # 4. Сохраняем файл в облачное хранилище (S3/R2 и т.д.) по хэшу содержимого:
+                # если такой файл уже загружали, повторно он не загружается
                 try:
-                    saved_path = default_storage.save(file_save_path, file)
-                    print(f"  ...Файл '{file.name}' сохранен в хранилище по пути: {saved_path}")
+                    sha256, size = blobs.hash_file(file)
+                    default_ext = ".mp4" if file_type_string == 'video' else ".jpg"
+                    blob = blobs.store_blob(file, sha256, size, blobs.extension_of(file.name, default_ext))
+                    print(f"  ...Файл '{file.name}' сохранен в хранилище по пути: {blob.file_path}")
+                    if file_type_string == 'image' and not blob.thumbnail_path:
+                        try:
+                            file.seek(0)
+                            derivatives.build_sync(blob, file.read())
+                        except Exception as e:
+                            # Без уменьшенных копий акция все равно создается
+                            print(f"  ⚠️ Не удалось сделать уменьшенные копии '{file.name}': {e}")
 
                     # 5. Создаем запись Media в базе данных
-                    Media.objects.create(
-                        promotion=new_promo,
-                        file_path=saved_path, # Используем путь, который вернуло хранилище
-                        file_type=file_type_string
-                    )
+                    blobs.create_media(new_promo, blob, file_type_string)
                 except Exception as e:
                     # Если один из файлов не сохранился, это проблема.
                     # Мы удалим уже созданную акцию, чтобы не было "мусора".
@@ -237,21 +239,38 @@ class TriggerParseView(APIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Принимает POST-запрос и запускает команду парсинга в отдельном потоке.
+        Принимает POST-запрос и ставит задание на парсинг в очередь.
+        Само задание выполняет воркер (manage.py parser_worker) с уже запущенным браузером.
+        Можно передать выборку: ids, city, subcategory, category, stale_hours (см. ParseTriggerSerializer).
         """
-        def run_command_in_thread():
-            # Эта функция будет выполняться в фоновом режиме,
-            # чтобы не заставлять пользователя ждать завершения парсинга.
-            print("Запуск парсинга из API...")
-            call_command('parse_instagram')
-            print("Парсинг из API завершен.")
+        serializer = ParseTriggerSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = dict(selection_params(serializer.validated_data))
+        if params.get('ids'):
+            params['ids'] = sorted(set(params['ids']))
+        if serializer.validated_data['full']:
+            params['full'] = True
 
-        # Запускаем команду в отдельном потоке
-        thread = threading.Thread(target=run_command_in_thread)
-        thread.start()
+        job, created = jobs.enqueue(**params)
+        if created:
+            print(f"Задание на парсинг #{job.id} поставлено в очередь из API.")
+            message = "Процесс парсинга запущен в фоновом режиме. Результаты появятся в разделе модерации через несколько минут."
+        else:
+            # Повторное нажатие не запускает второй парсинг
+            message = "Такое задание уже стоит в очереди."
 
         # Сразу же отвечаем пользователю, что задача принята
         return Response(
-            {"message": "Процесс парсинга запущен в фоновом режиме. Результаты появятся в разделе модерации через несколько минут."},
+            {"message": message, "job_id": job.id, "created": created},
             status=status.HTTP_202_ACCEPTED
-        )
\ No newline at end of file
+        )
+
+
+class ParseJobDetailView(generics.RetrieveAPIView):
+    """
+    Статус и прогресс задания на парсинг.
+    Доступно только администраторам.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    queryset = ParseJob.objects.all()
+    serializer_class = ParseJobSerializer